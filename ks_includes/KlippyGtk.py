@@ -7,6 +7,7 @@ import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gdk, GdkPixbuf, Gio, Gtk, Pango
+from ks_includes.thumbnails import ThumbnailCache
 from ks_includes.widgets.scroll import CustomScrolledWindow
 
 
@@ -86,6 +87,8 @@ class KlippyGtk:
         if self.ultra_tall:
             self.keyboard_height = self.keyboard_height * 0.5
 
+        self.thumbnails = ThumbnailCache(self)
+
         self.color_list = {}  # This is set by screen.py init_style()
         for key in self.color_list:
             if "base" in self.color_list[key]:
@@ -151,7 +154,11 @@ class KlippyGtk:
         response = self.screen.apiclient.get_thumbnail_stream(resource)
         if response is False:
             return None
-        stream = Gio.MemoryInputStream.new_from_data(response, None)
+        return self.PixbufFromBytes(response, width, height)
+
+    @staticmethod
+    def PixbufFromBytes(data, width=-1, height=-1):
+        stream = Gio.MemoryInputStream.new_from_data(data, None)
         try:
             pixbuf = GdkPixbuf.Pixbuf.new_from_stream_at_scale(stream, int(width), int(height), True)
         except Exception as e:
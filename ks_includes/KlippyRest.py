@@ -1,18 +1,171 @@
 import logging
 import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 
-import requests
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+from ks_includes import jsoncodec
 
 
 class KlippyRest:
-    def __init__(self, ip, port=7125, api_key=False, path='', ssl=None):
+    def __init__(self, ip, port=7125, api_key=False, path='', ssl=None, timeout=4, retries=2):
         self.ip = ip
         self.port = port
         self.path = f"/{path}" if path else ''
         self.ssl = ssl
         self.api_key = api_key
         self.ssl = int(self.port) in {443, 7130} if ssl is None else bool(ssl)
-        self.status = ''
+        self._status = ''
+        self.status_lock = threading.Lock()
+        self.timeout = timeout
+        self.retries = retries
+        # Every thread gets its own session, they aren't meant to be shared between threads
+        self.local = threading.local()
+        self.sessions = []
+        self.session_lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.stats = {}
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rest")
+        self.dropped = set()
+        self.closed = False
+
+    def close(self):
+        logging.info(f"REST latency: {self.get_stats()}")
+        # Callbacks of the requests still running are dropped, they belong to the old connection
+        self.closed = True
+        self.executor.shutdown(wait=False)
+        with self.session_lock:
+            for session in self.sessions:
+                session.close()
+            self.sessions.clear()
+
+    def get_session(self):
+        # requests is slow to import, so it's loaded with the first request instead of at startup
+        session = getattr(self.local, "session", None)
+        if session is not None:
+            return session
+        with self.session_lock:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+
+            # A session per printer and thread keeps the connections (and TLS sessions) alive between requests.
+            # Only idempotent requests are retried, a POST may have already been executed by moonraker.
+            # Read timeouts are not, some requests are still made from the main thread and it would freeze
+            # for the timeout times the retries
+            session = requests.Session()
+            retry = Retry(total=self.retries, connect=self.retries, read=0, backoff_factor=.25,
+                          status_forcelist=(502, 503, 504), raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            if self.api_key:
+                session.headers["x-api-key"] = self.api_key
+            self.sessions.append(session)
+        self.local.session = session
+        return session
+
+    def call_async(self, func, callback=None, *args):
+        # Runs func in the worker pool, callback(result, *args) is called from the GTK main loop
+        return self._notify(self.executor.submit(func), callback, args)
+
+    def _notify(self, future, callback, args):
+        if callback is not None:
+            future.add_done_callback(lambda f: GLib.idle_add(self._deliver, f, callback, args))
+        return future
+
+    def cancel(self, future):
+        # A request that is already running can't be stopped, its callback is dropped instead
+        if not future.cancel():
+            self.dropped.add(future)
+
+    def _deliver(self, future, callback, args):
+        if future in self.dropped:
+            self.dropped.discard(future)
+            return False
+        if self.closed or future.cancelled():
+            return False
+        try:
+            result = future.result()
+        except Exception as e:
+            logging.exception(f"REST worker error: {e}")
+            result = False
+        callback(result, *args)
+        return False
+
+    def send_request_async(self, method, callback=None, *args, json=True, timeout=None):
+        return self.call_async(lambda: self.send_request(method, json, timeout), callback, *args)
+
+    def send_requests_async(self, methods, callback=None, *args):
+        # The requests are sent in parallel, callback gets the list of results once all of them are done
+        futures = [self.executor.submit(self.send_request, method) for method in methods]
+        combined = Future()
+        lock = threading.Lock()
+        remaining = [len(futures)]
+
+        def done(_):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            if combined.set_running_or_notify_cancel():
+                combined.set_result([self._result(future) for future in futures])
+
+        self._notify(combined, callback, args)
+        for future in futures:
+            future.add_done_callback(done)
+        return combined
+
+    @staticmethod
+    def _result(future):
+        if future.cancelled():
+            return False
+        error = future.exception()
+        if error is not None:
+            logging.error(f"REST worker error: {error}")
+            return False
+        return future.result()
+
+    def post_request_async(self, method, callback=None, *args, data=None, json=None, json_response=True):
+        return self.call_async(lambda: self.post_request(method, data, json, json_response), callback, *args)
+
+    def get_stats(self):
+        # Latency per endpoint group in ms: count, errors, average and max
+        with self.stats_lock:
+            return {
+                name: {
+                    "count": stat["count"],
+                    "errors": stat["errors"],
+                    "avg": round(stat["total"] / stat["count"], 1),
+                    "max": round(stat["max"], 1),
+                }
+                for name, stat in self.stats.items() if stat["count"]
+            }
+
+    def record_latency(self, method, elapsed, error=False):
+        # Grouped by the first two components, otherwise every thumbnail would get an entry
+        name = "/".join(method.split("?")[0].split("/")[:2])
+        with self.stats_lock:
+            stat = self.stats.setdefault(name, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0})
+            stat["count"] += 1
+            stat["errors"] += int(error)
+            stat["total"] += elapsed
+            stat["max"] = max(stat["max"], elapsed)
+
+    @property
+    def status(self):
+        with self.status_lock:
+            return self._status
+
+    @status.setter
+    def status(self, status):
+        # Written by the worker threads too
+        with self.status_lock:
+            self._status = status
 
     @property
     def endpoint(self):
@@ -25,6 +178,9 @@ class KlippyRest:
     def get_server_info(self):
         return self.send_request("server/info")
 
+    def get_server_info_async(self, callback, *args):
+        return self.send_request_async("server/info", callback, *args)
+
     def get_oneshot_token(self):
         return self.send_request("access/oneshot_token")
 
@@ -37,24 +193,35 @@ class KlippyRest:
     def get_thumbnail_stream(self, thumbnail):
         return self.send_request(f"server/files/gcodes/{thumbnail}", json=False)
 
-    def _do_request(self, method, request_method, data=None, json=None, json_response=True, timeout=3):
+    def _do_request(self, method, request_method, data=None, json=None, json_response=True, timeout=None):
         url = f"{self.endpoint}/{method}"
-        headers = {"x-api-key": self.api_key} if self.api_key else {}
+        headers = {}
+        if json is not None:
+            data = jsoncodec.dumps(json).encode()
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
         try:
-            callee = getattr(requests, request_method)
-            response = callee(url, json=json, data=data, headers=headers, timeout=timeout)
+            response = self.get_session().request(
+                request_method, url, data=data, headers=headers, timeout=timeout or self.timeout
+            )
             response.raise_for_status()
             self.status = ''
-            return response.json() if json_response else response.content
+            result = jsoncodec.loads(response.content) if json_response else response.content
         except Exception as e:
-            self.status = self.format_status(e)
-            logging.error(self.status.replace('\n', '>>'))
+            self.record_latency(method, (time.perf_counter() - start) * 1000, error=True)
+            status = self.format_status(e)
+            self.status = status
+            logging.error(status.replace('\n', '>>'))
             return False
+        elapsed = (time.perf_counter() - start) * 1000
+        self.record_latency(method, elapsed)
+        logging.debug(f"{request_method.upper()} {method} {elapsed:.1f} ms")
+        return result
 
     def post_request(self, method, data=None, json=None, json_response=True):
         return self._do_request(method, "post", data, json, json_response)
 
-    def send_request(self, method, json=True, timeout=4):
+    def send_request(self, method, json=True, timeout=None):
         res = self._do_request(method, "get", json_response=json, timeout=timeout)
         return self.process_response(res) if json else res
 
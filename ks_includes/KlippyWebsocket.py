@@ -1,7 +1,7 @@
 #!/usr/bin/python
 
-import json
 import logging
+import re
 import threading
 
 import gi
@@ -9,8 +9,18 @@ import websocket
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import GLib
+from ks_includes import jsoncodec
 from ks_includes.KlippyGcodes import KlippyGcodes
 
+# Status fields that must reach the UI immediately instead of waiting for the next coalesced frame
+CRITICAL_STATUS_FIELDS = (
+    ("webhooks", "state"),
+    ("print_stats", "state"),
+    ("idle_timeout", "state"),
+)
+# Temperature reports (M105 / auto-report) are not shown anywhere, drop them before they reach the UI
+TEMPERATURE_RESPONSE = re.compile(r'^(?:ok\s+)?(B|C|T\d*):')
+
 
 class KlippyWebsocket(threading.Thread):
     _req_id = 0
@@ -20,7 +30,7 @@ class KlippyWebsocket(threading.Thread):
     reconnect_count = 0
     max_retries = 4
 
-    def __init__(self, callback, host, port, api_key, path='', ssl=None):
+    def __init__(self, callback, host, port, api_key, path='', ssl=None, status_interval=100):
         threading.Thread.__init__(self)
         self._wst = None
         self.ws_url = None
@@ -34,6 +44,15 @@ class KlippyWebsocket(threading.Thread):
         self.ssl = int(self.port) in {443, 7130} if ssl is None else bool(ssl)
         self.header = {"x-api-key": api_key} if api_key else {}
         self.api_key = api_key
+        self.status_interval = max(int(status_interval), 0)
+        self._status_lock = threading.Lock()
+        self._pending_status = {}
+        self._status_timer = None
+        self._status_cache = {}
+        # Only force_query results are always applied to the Printer, other queries may be used just by a panel
+        self.preprocessors = {
+            "printer.objects.force_query": self._prime_status_cache,
+        }
 
     @property
     def _url(self):
@@ -90,24 +109,90 @@ class KlippyWebsocket(threading.Thread):
 
     def on_message(self, *args):
         message = args[1] if len(args) == 2 else args[0]
-        response = json.loads(message)
+        response = jsoncodec.loads(message)
         if "id" in response and response['id'] in self.callback_table:
-            args = (response,
-                    self.callback_table[response['id']][1],
-                    self.callback_table[response['id']][2],
-                    *self.callback_table[response['id']][3])
-            GLib.idle_add(self.callback_table[response['id']][0], *args, priority=GLib.PRIORITY_HIGH_IDLE)
-            self.callback_table.pop(response['id'])
+            callback, method, params, cb_args = self.callback_table.pop(response['id'])
+            if method in self.preprocessors and "result" in response:
+                try:
+                    response = self.preprocessors[method](response, method, params)
+                except Exception as e:
+                    logging.exception(f"Error preprocessing {method}: {e}")
+            # The deltas received before the response are older, they must not be applied on top of it
+            if self._pending_status:
+                GLib.idle_add(self._flush_status, priority=GLib.PRIORITY_HIGH_IDLE)
+            GLib.idle_add(callback, response, method, params, *cb_args, priority=GLib.PRIORITY_HIGH_IDLE)
             return
 
         if "method" in response and "on_message" in self._callback:
             args = (response['method'], response['params'][0] if "params" in response else {})
-            GLib.idle_add(self._callback['on_message'], *args, priority=GLib.PRIORITY_HIGH_IDLE)
+            if args[0] == "notify_status_update":
+                self._queue_status(args[1])
+            elif args[0] == "notify_gcode_response" and TEMPERATURE_RESPONSE.match(args[1]):
+                pass
+            else:
+                if self._pending_status:
+                    GLib.idle_add(self._flush_status, priority=GLib.PRIORITY_HIGH_IDLE)
+                GLib.idle_add(self._callback['on_message'], *args, priority=GLib.PRIORITY_HIGH_IDLE)
         if self.closing:
             timer = threading.Timer(2, self.ws.close)
             timer.start()
         return
 
+    def add_preprocessor(self, method, preprocessor):
+        # The preprocessor runs in the websocket thread and receives (response, method, params)
+        self.preprocessors[method] = preprocessor
+
+    def reset_status_cache(self):
+        with self._status_lock:
+            self._status_cache.clear()
+
+    def _prime_status_cache(self, response, method, params):
+        if "status" in response["result"]:
+            with self._status_lock:
+                for obj, fields in response["result"]["status"].items():
+                    if isinstance(fields, dict):
+                        self._status_cache.setdefault(obj, {}).update(fields)
+        return response
+
+    def _queue_status(self, data):
+        # Runs in the websocket thread, keeps only the fields that actually changed
+        # and merges them with the pending deltas until the next frame
+        with self._status_lock:
+            changes = {}
+            for obj, fields in data.items():
+                if not isinstance(fields, dict):
+                    changes[obj] = fields
+                    continue
+                known = self._status_cache.setdefault(obj, {})
+                changed = {k: v for k, v in fields.items() if k not in known or known[k] != v}
+                if changed:
+                    known.update(changed)
+                    changes[obj] = changed
+            if not changes:
+                return
+            for obj, fields in changes.items():
+                if obj in self._pending_status and isinstance(fields, dict):
+                    self._pending_status[obj].update(fields)
+                else:
+                    self._pending_status[obj] = fields
+            if self.status_interval == 0 or any(
+                    field in changes.get(obj, {}) for obj, field in CRITICAL_STATUS_FIELDS):
+                GLib.idle_add(self._flush_status, priority=GLib.PRIORITY_HIGH_IDLE)
+            elif self._status_timer is None:
+                self._status_timer = GLib.timeout_add(self.status_interval, self._flush_status, True)
+
+    def _flush_status(self, from_timer=False):
+        # Runs in the main loop, dispatches everything merged so far as a single update
+        with self._status_lock:
+            if not from_timer and self._status_timer is not None:
+                GLib.source_remove(self._status_timer)
+            data = self._pending_status
+            self._pending_status = {}
+            self._status_timer = None
+        if data:
+            self._callback['on_message']("notify_status_update", data)
+        return False
+
     def send_method(self, method, params=None, callback=None, *args):
         if not self.connected or self.closing:
             return False
@@ -124,11 +209,12 @@ class KlippyWebsocket(threading.Thread):
             "params": params,
             "id": self._req_id
         }
-        self.ws.send(json.dumps(data))
+        self.ws.send(jsoncodec.dumps(data))
         return True
 
     def on_open(self, *args):
         logging.info("Moonraker Websocket Open")
+        self.reset_status_cache()
         self.connected = True
         self.connecting = False
         self.reconnect_count = 0
@@ -216,6 +302,7 @@ class MoonrakerApi:
 
     def object_subscription(self, updates):
         logging.debug("Sending printer.objects.subscribe")
+        self._ws.reset_status_cache()
         return self._ws.send_method(
             "printer.objects.subscribe",
             updates
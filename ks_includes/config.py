@@ -212,7 +212,10 @@ class KlipperScreenConfig:
                 )
                 numbers = (
                     'job_complete_timeout', 'job_error_timeout', 'move_speed_xy', 'move_speed_z',
-                    'print_estimate_compensation', 'width', 'height',
+                    'print_estimate_compensation', 'width', 'height', 'status_update_interval',
+                    'metadata_request_window', 'http_timeout', 'http_retries', 'panel_preload',
+                    'panel_cache_size', 'panel_cache_memory', 'temp_history_hours', 'max_fps', 'max_fps_graph',
+                    'max_fps_bed_mesh', 'max_fps_object_map', 'max_fps_progress', 'max_fps_color_preview',
                 )
             elif section.startswith('printer '):
                 bools = (
@@ -1,24 +1,159 @@
 import logging
 import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 
 import gi
 
 gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+from ks_includes import jsoncodec
+
+cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "KlipperScreen")
+
+# A single thread writes the metadata caches, so the appends and the compactions stay in order
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata")
+
+
+class MetadataCache:
+    # Persistent gcode metadata, stored as json lines where the last line of a path wins.
+    # An entry is only valid while the file keeps the same modification time and size.
+    def __init__(self, name):
+        name = re.sub(r'[^\w.-]', '_', f'{name}')
+        self.path = os.path.join(cache_dir, f"metadata_{name}.jsonl")
+        self.entries = {}
+        self.pending = []
+        self.save_timeout = None
+        self.last_write = None
+        self.load()
+
+    def load(self):
+        lines = 0
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = jsoncodec.loads(line)
+                    except ValueError:
+                        continue
+                    if entry.get('metadata') is None:
+                        self.entries.pop(entry['path'], None)
+                    else:
+                        self.entries[entry['path']] = entry['metadata']
+        except FileNotFoundError:
+            return
+        except (OSError, KeyError) as e:
+            logging.error(f"Unable to load the metadata cache {self.path}: {e}")
+            return
+        logging.info(f"Metadata cache: {len(self.entries)} files")
+        if lines > 2 * len(self.entries) + 100:
+            self.compact()
+
+    def get(self, path, modified=None, size=None):
+        metadata = self.entries.get(path)
+        if metadata is None \
+                or modified is not None and metadata.get('modified') != modified \
+                or size is not None and metadata.get('size') != size:
+            return None
+        return metadata
+
+    def put(self, path, metadata):
+        self.entries[path] = metadata
+        self._queue({"path": path, "metadata": metadata})
+
+    def remove(self, path):
+        if self.entries.pop(path, None) is not None:
+            self._queue({"path": path, "metadata": None})
+
+    def prune(self, paths):
+        stale = set(self.entries) - set(paths)
+        if stale:
+            for path in stale:
+                del self.entries[path]
+            self.compact()
+
+    def _queue(self, entry):
+        self.pending.append(entry)
+        if self.save_timeout is None:
+            self.save_timeout = GLib.timeout_add_seconds(2, self.save)
+
+    def save(self):
+        if self.save_timeout is not None:
+            GLib.source_remove(self.save_timeout)
+            self.save_timeout = None
+        if not self.pending:
+            return False
+        self.last_write = _writer.submit(self._append, self.pending)
+        self.pending = []
+        return False
+
+    def close(self):
+        # Used on exit, writes the pending entries and waits until everything is on disk
+        self.save()
+        if self.last_write is not None:
+            try:
+                self.last_write.result(timeout=5)
+            except Exception as e:
+                logging.error(f"Unable to save the metadata cache {self.path}: {e}")
+
+    def _append(self, entries):
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(self.path, "a") as f:
+                f.writelines(f"{jsoncodec.dumps(entry)}\n" for entry in entries)
+        except OSError as e:
+            logging.error(f"Unable to save the metadata cache {self.path}: {e}")
+
+    def compact(self):
+        # The pending entries are already in the snapshot
+        self.pending = []
+        if self.save_timeout is not None:
+            GLib.source_remove(self.save_timeout)
+            self.save_timeout = None
+        self.last_write = _writer.submit(self._rewrite, list(self.entries.items()))
+
+    def _rewrite(self, entries):
+        tmp = f"{self.path}.tmp"
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp, "w") as f:
+                f.writelines(
+                    f"{jsoncodec.dumps({'path': path, 'metadata': metadata})}\n"
+                    for path, metadata in entries
+                )
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logging.error(f"Unable to save the metadata cache {self.path}: {e}")
 
 
 class KlippyFiles:
     def __init__(self, screen):
         self._screen = screen
         self.callbacks = []
-        self.files = {}
         self.directories = []
         self.gcodes_path = None
+        self.cache = MetadataCache(screen.connecting_to_printer)
+        self.files = {path: dict(metadata) for path, metadata in self.cache.entries.items()}
+        # Metadata requests are sent through a bounded window, visible files go first
+        self.request_window = max(screen._config.get_main_config().getint("metadata_request_window", 4), 1)
+        self.in_flight = set()
+        self.priority_requests = {}
+        self.background_requests = {}
+        # Files whose metadata request failed, they are requested again only when they change
+        self.failed = set()
 
     def reinit(self):
         self.callbacks.clear()
-        self.files.clear()
         self.directories.clear()
         self.gcodes_path = None
+        self.in_flight.clear()
+        self.priority_requests.clear()
+        self.background_requests.clear()
+        self.failed.clear()
+        self.cache.save()
+        self.cache = MetadataCache(self._screen.connecting_to_printer)
+        self.files = {path: dict(metadata) for path, metadata in self.cache.entries.items()}
 
     def set_gcodes_path(self):
         virtual_sdcard = self._screen.printer.get_config_section("virtual_sdcard")
@@ -27,42 +162,60 @@ class KlippyFiles:
         logging.info(f"Gcodes path: {self.gcodes_path}")
 
     def _callback(self, result, method, params):
+        if method == "server.files.metadata":
+            self.in_flight.discard(params['filename'])
+            self.send_metadata_requests()
         if "error" in result:
             logging.debug(result["error"])
+            if method == "server.files.metadata":
+                self.failed.add(params['filename'])
             return
         if method == "server.files.list":
             for item in result["result"]:
-                self.files[item["path"]] = item
-                self.request_metadata(item["path"])
+                cached = self.cache.get(item["path"], item.get("modified"), item.get("size"))
+                if cached is None:
+                    self.files[item["path"]] = item
+                    self.request_metadata(item["path"])
+                else:
+                    self.files[item["path"]] = {**cached, **item}
+            listed = {item["path"] for item in result["result"]}
+            for path in set(self.files) - listed:
+                del self.files[path]
+            self.cache.prune(listed)
         elif method == "server.files.metadata":
-            for x in result['result']:
-                if params['filename'] not in self.files:
-                    self.files[params['filename']] = {}
-                self.files[params['filename']][x] = result['result'][x]
+            if params['filename'] not in self.files:
+                self.files[params['filename']] = {}
+            self.files[params['filename']].update(result['result'])
+            self.cache.put(params['filename'], result['result'])
             if 'path' not in self.files[params['filename']]:
                 self.files[params['filename']]['path'] = params['filename']
-            if "thumbnails" in self.files[params['filename']]:
-                self.files[params['filename']]['thumbnails'].sort(key=lambda y: y['size'], reverse=True)
-                for thumbnail in self.files[params['filename']]['thumbnails']:
-                    thumbnail['local'] = False
-                    if self.gcodes_path is not None:
-                        path = os.path.join(
-                            os.path.dirname(os.path.join(self.gcodes_path, params['filename'])),
-                            thumbnail['relative_path']
-                        )
-                        if os.access(path, os.R_OK):
-                            thumbnail['local'] = True
-                            thumbnail['path'] = path
-                    if thumbnail['local'] is False:
-                        thumbnail['path'] = os.path.join(
-                            os.path.dirname(params['filename']),
-                            thumbnail['relative_path']
-                        )
             self._screen.process_update("notify_metadata_update", params)
             self.run_callbacks(
                 "modify_file", {'action': "modify_file", 'item': self.files[params['filename']]}
             )
 
+    def preprocess_metadata(self, result, method, params):
+        # Runs in the websocket thread, so the disk access for local thumbnails doesn't block the UI
+        metadata = result['result']
+        if "thumbnails" in metadata:
+            metadata['thumbnails'].sort(key=lambda y: y['size'], reverse=True)
+            for thumbnail in metadata['thumbnails']:
+                thumbnail['local'] = False
+                if self.gcodes_path is not None:
+                    path = os.path.join(
+                        os.path.dirname(os.path.join(self.gcodes_path, params['filename'])),
+                        thumbnail['relative_path']
+                    )
+                    if os.access(path, os.R_OK):
+                        thumbnail['local'] = True
+                        thumbnail['path'] = path
+                if thumbnail['local'] is False:
+                    thumbnail['path'] = os.path.join(
+                        os.path.dirname(params['filename']),
+                        thumbnail['relative_path']
+                    )
+        return result
+
     def add_file(self, item):
         if 'path' not in item:
             logging.info(f"Error adding item, unknown path: {item}")
@@ -73,6 +226,7 @@ class KlippyFiles:
     def remove_file(self, filename):
         if filename in self.files:
             self.files.pop(filename)
+        self.cache.remove(filename)
 
     def add_callback(self, callback):
         self.callbacks.append(callback)
@@ -89,6 +243,8 @@ class KlippyFiles:
             or data['action'].endswith("file") and not self.is_gcode(data['item']['path'])
         ):
             return
+        if data['action'] in ("create_file", "modify_file"):
+            self.failed.discard(data['item']['path'])
         if data['action'] == "create_file":
             self.add_file(data['item'])
         elif data['action'] == "delete_file":
@@ -98,6 +254,7 @@ class KlippyFiles:
         elif data['action'] == "move_file":
             self.files[data['item']['path']] = self.files.pop(data['source_item']['path'])
             self.files[data['item']['path']].update(data['item'])
+            self.cache.remove(data['source_item']['path'])
         self.run_callbacks(data['action'], data)
 
     @staticmethod
@@ -120,11 +277,48 @@ class KlippyFiles:
     def has_thumbnail(self, filename):
         return filename in self.files and "thumbnails" in self.files[filename]
 
-    def request_metadata(self, filename):
-        if self.is_gcode(filename):
-            self._screen._ws.klippy.get_file_metadata(filename, self._callback)
-        else:
+    def request_metadata(self, filename, priority=False):
+        if not self.is_gcode(filename):
             logging.info("Not a gcode")
+            return
+        if filename in self.in_flight or filename in self.failed:
+            return
+        if priority:
+            self.background_requests.pop(filename, None)
+            self.priority_requests[filename] = True
+        elif filename not in self.priority_requests:
+            self.background_requests[filename] = True
+        self.send_metadata_requests()
+
+    def send_metadata_requests(self):
+        while len(self.in_flight) < self.request_window:
+            queue = self.priority_requests or self.background_requests
+            if not queue:
+                return
+            filename = next(iter(queue))
+            del queue[filename]
+            if not self._screen._ws.klippy.get_file_metadata(filename, self._callback):
+                logging.debug("Websocket not available, dropping metadata requests")
+                self.priority_requests.clear()
+                self.background_requests.clear()
+                return
+            self.in_flight.add(filename)
+
+    def prioritize_metadata(self, filename):
+        # Used for the files that are on screen, moves them ahead of the background requests
+        if filename in self.background_requests \
+                or filename not in self.cache.entries and filename not in self.priority_requests:
+            self.request_metadata(filename, priority=True)
+
+    def cancel_metadata_requests(self):
+        # The requests that are already in flight can't be cancelled, only the queued ones
+        self.priority_requests.clear()
+        self.background_requests.clear()
+
+    def connection_lost(self):
+        # The responses of the requests in flight won't arrive
+        self.in_flight.clear()
+        self.cancel_metadata_requests()
 
     def refresh_files(self):
         self._screen._ws.klippy.get_file_list(self._callback)
@@ -136,7 +330,7 @@ class KlippyFiles:
     def get_file_info(self, path):
         if path not in self.files:
             logging.info(f"Metadata not found {path}")
-            self.request_metadata(path)
+            self.request_metadata(path, priority=True)
             return {}
         return self.files[path]
 
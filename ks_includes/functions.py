@@ -9,6 +9,8 @@ import threading
 import traceback
 from queue import SimpleQueue as Queue
 
+from ks_includes import jsoncodec
+
 dpms_loaded = False
 try:
     ctypes.cdll.LoadLibrary('libXext.so.6')
@@ -112,6 +114,7 @@ class KlipperScreenLoggingHandler(logging.handlers.RotatingFileHandler):
             'header': f"{'-' * 20}KlipperScreen Log Start{'-' * 20}",
             'version': f"KlipperScreen Version: {get_software_version()}",
             'py_ver': f"Python version: {sys.version_info.major}.{sys.version_info.minor}",
+            'json': f"JSON library: {jsoncodec.name}",
         }
         self.log_start()
 
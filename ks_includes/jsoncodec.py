@@ -0,0 +1,37 @@
+import json
+
+# Use the fastest JSON library available, orjson and ujson are optional
+try:
+    import orjson
+
+    name = "orjson"
+
+    def loads(data):
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson rejects NaN and Infinity, which the stdlib (and Moonraker) allow
+            return json.loads(data)
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+
+except ImportError:
+    try:
+        import ujson
+
+        name = "ujson"
+
+        def loads(data):
+            try:
+                return ujson.loads(data)
+            except ValueError:
+                return json.loads(data)
+
+        def dumps(obj):
+            return ujson.dumps(obj, ensure_ascii=False)
+
+    except ImportError:
+        name = "json"
+        loads = json.loads
+        dumps = json.dumps
@@ -0,0 +1,147 @@
+import math
+
+
+class MeshView:
+    # A rotated or flipped view of the mesh values, nothing is copied:
+    # the value at row i, column j is values[base + i * row_step + j * column_step]
+    __slots__ = ('values', 'rows', 'columns', 'base', 'row_step', 'column_step', 'mesh_min', 'mesh_max')
+
+    def __init__(self, values, rows, columns, base, row_step, column_step, mesh_min, mesh_max):
+        self.values = values
+        self.rows = rows
+        self.columns = columns
+        self.base = base
+        self.row_step = row_step
+        self.column_step = column_step
+        # Labels of the left, bottom (min) and right, top (max) edges
+        self.mesh_min = mesh_min
+        self.mesh_max = mesh_max
+
+    def get(self, i, j):
+        return self.values[self.base + i * self.row_step + j * self.column_step]
+
+    def row(self, i):
+        start = self.base + i * self.row_step
+        return self.values[start:start + self.columns * self.column_step:self.column_step] if self.column_step > 0 \
+            else [self.values[start + j * self.column_step] for j in range(self.columns)]
+
+    def to_rows(self):
+        return [list(self.row(i)) for i in range(self.rows)]
+
+    def flip_rows(self):
+        return MeshView(
+            self.values, self.rows, self.columns, self.base + (self.rows - 1) * self.row_step, -self.row_step,
+            self.column_step, [self.mesh_min[0], self.mesh_max[1]], [self.mesh_max[0], self.mesh_min[1]]
+        )
+
+    def flip_columns(self):
+        return MeshView(
+            self.values, self.rows, self.columns, self.base + (self.columns - 1) * self.column_step, self.row_step,
+            -self.column_step, [self.mesh_max[0], self.mesh_min[1]], [self.mesh_min[0], self.mesh_max[1]]
+        )
+
+    def rotate(self, rotation):
+        # Clockwise
+        if rotation == 90:
+            return MeshView(
+                self.values, self.columns, self.rows, self.base + (self.rows - 1) * self.row_step,
+                self.column_step, -self.row_step,
+                [self.mesh_min[1], self.mesh_max[0]], [self.mesh_max[1], self.mesh_min[0]]
+            )
+        if rotation == 180:
+            return self.flip_rows().flip_columns()
+        if rotation == 270:
+            return MeshView(
+                self.values, self.columns, self.rows, self.base + (self.columns - 1) * self.column_step,
+                -self.column_step, self.row_step,
+                [self.mesh_max[1], self.mesh_min[0]], [self.mesh_min[1], self.mesh_max[0]]
+            )
+        return self
+
+    def upsample(self, factor):
+        # Bicubic (Catmull-Rom) interpolation done in two passes, first along the rows then along the columns,
+        # returns ((rows - 1) * factor + 1) rows of ((columns - 1) * factor + 1) values
+        rows = [_upsample(self.row(i), factor) for i in range(self.rows)]
+        columns = [_upsample(column, factor) for column in zip(*rows)]
+        return [list(row) for row in zip(*columns)]
+
+
+def _upsample(values, factor):
+    last = len(values) - 1
+    if factor <= 1 or last < 1:
+        return list(values)
+    result = []
+    steps = [k / factor for k in range(factor)]
+    for i in range(last):
+        p0 = values[max(i - 1, 0)]
+        p1 = values[i]
+        p2 = values[i + 1]
+        p3 = values[min(i + 2, last)]
+        a = 2 * p0 - 5 * p1 + 4 * p2 - p3
+        b = 3 * (p1 - p2) + p3 - p0
+        c = p2 - p0
+        result.extend(p1 + 0.5 * t * (c + t * (a + t * b)) for t in steps)
+    result.append(values[last])
+    return result
+
+
+class MeshModel:
+    # A bed mesh parsed once into a flat list, row 0 is the front of the bed (min y)
+    def __init__(self, matrix, mesh_min, mesh_max):
+        self.rows = len(matrix)
+        self.columns = len(matrix[0]) if matrix else 0
+        self.values = [float(value) for row in matrix for value in row]
+        self.mesh_min = [float(mesh_min[0]), float(mesh_min[1])]
+        self.mesh_max = [float(mesh_max[0]), float(mesh_max[1])]
+        self.stats = None
+
+    @staticmethod
+    def parse_points(points):
+        return [[float(value) for value in row.split(',')] for row in points.strip().split('\n')]
+
+    def display_view(self, rotation=0, invert_x=False, invert_y=False):
+        # The first row of the view is drawn at the top
+        view = MeshView(
+            self.values, self.rows, self.columns, (self.rows - 1) * self.columns, -self.columns, 1,
+            self.mesh_min, self.mesh_max
+        )
+        if invert_x:
+            view = view.flip_columns()
+        if invert_y:
+            view = view.flip_rows()
+        return view.rotate(rotation)
+
+    def get_stats(self):
+        # Range, standard deviation and the largest deviation from the best fitting plane
+        if self.stats is not None or not self.values:
+            return self.stats
+        values = self.values
+        count = len(values)
+        mean = sum(values) / count
+        std = math.sqrt(sum((value - mean) ** 2 for value in values) / count)
+        # On a regular grid the centered coordinates are orthogonal, so the least squares plane
+        # z = mean + slope_x * x + slope_y * y has independent slopes
+        xs = [j - (self.columns - 1) / 2 for j in range(self.columns)]
+        ys = [i - (self.rows - 1) / 2 for i in range(self.rows)]
+        sxx = sum(x * x for x in xs) * self.rows
+        syy = sum(y * y for y in ys) * self.columns
+        sxz = syz = 0
+        for i, y in enumerate(ys):
+            row = values[i * self.columns:(i + 1) * self.columns]
+            sxz += sum(x * z for x, z in zip(xs, row))
+            syz += y * sum(row)
+        slope_x = sxz / sxx if sxx else 0
+        slope_y = syz / syy if syy else 0
+        deviation = max(
+            abs(values[i * self.columns + j] - mean - slope_x * x - slope_y * y)
+            for i, y in enumerate(ys) for j, x in enumerate(xs)
+        )
+        self.stats = {
+            "min": min(values),
+            "max": max(values),
+            "range": max(values) - min(values),
+            "mean": mean,
+            "std": std,
+            "plane_deviation": deviation,
+        }
+        return self.stats
@@ -0,0 +1,126 @@
+import logging
+import os
+import time
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+from ks_includes import jsoncodec
+from ks_includes.files import cache_dir
+
+# These do I/O, start hardware or talk to moonraker as soon as they are constructed
+NO_PRELOAD = {
+    "camera", "camera_lynxbot", "gcodes", "job_status", "main_menu", "menu", "network", "printer_select",
+    "shutdown", "spoolman", "splash_screen", "system",
+}
+
+
+class PanelPreloader:
+    # Constructs the panels that are likely to be opened next while the UI is idle,
+    # the candidates come from the menus and are ranked by how often they were opened
+    def __init__(self, screen, limit=3):
+        self._screen = screen
+        self.limit = limit
+        self.path = os.path.join(cache_dir, "panel_usage.json")
+        self.usage = {}
+        self.preloaded = []
+        self.queue = []
+        self.source = None
+        self.save_source = None
+        try:
+            with open(self.path) as f:
+                self.usage = jsoncodec.loads(f.read())
+        except (OSError, ValueError):
+            pass
+
+    def record(self, panel_name):
+        self.usage[panel_name] = self.usage.get(panel_name, 0) + 1
+        if panel_name in self.preloaded:
+            self.preloaded.remove(panel_name)
+        if self.save_source is None:
+            self.save_source = GLib.timeout_add_seconds(60, self.save)
+
+    def save(self):
+        self.save_source = None
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(self.path, "w") as f:
+                f.write(jsoncodec.dumps(self.usage))
+        except OSError as e:
+            logging.error(f"Unable to save the panel usage: {e}")
+        return False
+
+    def schedule(self, delay=2):
+        if self.limit <= 0:
+            return
+        self.cancel()
+        self.source = GLib.timeout_add_seconds(delay, self.start)
+
+    def cancel(self):
+        if self.source is not None:
+            GLib.source_remove(self.source)
+            self.source = None
+        self.queue.clear()
+
+    def start(self):
+        self.queue = self.candidates()
+        self.source = GLib.idle_add(self.preload_next, priority=GLib.PRIORITY_LOW) if self.queue else None
+        return False
+
+    def menu_panels(self, menu, subsection=""):
+        panels = []
+        for item in self._screen._config.get_menu_items(menu, subsection):
+            key = next(iter(item))
+            if item[key]['panel']:
+                panels.append((item[key]['panel'], item[key]['name']))
+            elif not item[key]['method']:
+                panels.extend(self.menu_panels(menu, key))
+        return panels
+
+    def candidates(self):
+        menu = "__print" if self._screen.printer.state in ("printing", "paused") else "__main"
+        panels = {}
+        for panel, title in self.menu_panels(menu):
+            if panel not in panels and panel not in NO_PRELOAD:
+                panels[panel] = title
+        # sorted is stable, so panels that were never opened keep the menu order
+        ranked = sorted(panels, key=lambda panel: self.usage.get(panel, 0), reverse=True)[:self.limit]
+        return [(panel, panels[panel]) for panel in ranked if self.needs_preload(panel)]
+
+    def needs_preload(self, panel):
+        return panel not in self._screen._cur_panels and (
+            panel not in self._screen.panels or panel in self._screen.panels_reinit
+        )
+
+    def preload_next(self):
+        if not self.queue or not self._screen.initialized:
+            self.source = None
+            return False
+        panel, title = self.queue.pop(0)
+        if not self.needs_preload(panel):
+            return True
+        start = time.perf_counter()
+        try:
+            if panel in self._screen.panels:
+                self._screen.panels[panel].__init__(self._screen, title)
+                self._screen.panels_reinit.remove(panel)
+            else:
+                self._screen.panels[panel] = self._screen._load_panel(panel).Panel(self._screen, title)
+        except Exception as e:
+            logging.exception(f"Unable to preload {panel}: {e}")
+            self._screen.panels.pop(panel, None)
+            return True
+        logging.debug(f"Preloaded {panel} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        self.preloaded.append(panel)
+        self.evict()
+        self._screen.evict_panels()
+        return True
+
+    def evict(self):
+        # Panels that were preloaded but never opened are dropped first, the least used ones
+        while len(self.preloaded) > self.limit:
+            panel = min(self.preloaded, key=lambda name: self.usage.get(name, 0))
+            self.preloaded.remove(panel)
+            if panel not in self._screen._cur_panels and panel in self._screen.panels:
+                self._screen.destroy_panel(panel)
@@ -1,13 +1,15 @@
 import logging
+import time
 
 import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import GLib
+from ks_includes.tempstore import TempHistory, TempSeries
 
 
 class Printer:
-    def __init__(self, state_cb, state_callbacks):
+    def __init__(self, state_cb, state_callbacks, history_hours=24):
         self.config = {}
         self.data = {}
         self.state = "disconnected"
@@ -25,6 +27,11 @@ class Printer:
         self.store_timeout = None
         self.tempstore = {}
         self.tempstore_size = 1200
+        # Seconds per sample and size of the tiers kept after the 1 s samples of the moonraker store
+        self.history_tiers = ((10, 3 * 360), (60, max(int(history_hours * 60), 1)))
+        self.temphistory = {}
+        # When the history got its last sample, to know how long it was interrupted
+        self.history_time = None
         self.cameras = []
         self.available_commands = {}
         self.spoolman = False
@@ -32,6 +39,7 @@ class Printer:
         self.temp_devices = self.sensors = None
         self.system_info = {}
         self.warnings = []
+        self.subscriptions = {}
 
     def reinit(self, printer_info, data):
         self.config = data['configfile']['config']
@@ -124,10 +132,13 @@ class Printer:
             return
         self.process_update(result["result"]["status"])
 
-    def process_update(self, data):
+    def process_update(self, data, diffed=False):
+        # Returns only the fields whose value actually changed,
+        # diffed data (the status updates of the websocket) has only the changes already
         if self.data is None:
-            return
+            return {}
 
+        changes = {}
         for x in data:
             if x == "configfile":
                 if 'config' in data[x]:
@@ -136,10 +147,37 @@ class Printer:
                     self.warnings = data[x]['warnings']
             if x not in self.data:
                 self.data[x] = {}
-            self.data[x].update(data[x])
-
+            old = self.data[x]
+            changed = data[x] if diffed else {k: v for k, v in data[x].items() if k not in old or old[k] != v}
+            if changed:
+                old.update(changed)
+                changes[x] = changed
+
+        if changes and self.subscriptions:
+            self.notify_subscribers(changes)
         if "webhooks" in data or "print_stats" in data or "idle_timeout" in data:
             self.process_status_update()
+        return changes
+
+    def subscribe(self, key, callback):
+        # key is "object.field" or "object", the callback receives (object, field, value)
+        callbacks = self.subscriptions.setdefault(key, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+    def unsubscribe(self, key, callback):
+        if key in self.subscriptions and callback in self.subscriptions[key]:
+            self.subscriptions[key].remove(callback)
+            if not self.subscriptions[key]:
+                del self.subscriptions[key]
+
+    def notify_subscribers(self, changes):
+        for obj, fields in changes.items():
+            for field, value in fields.items():
+                for callback in self.subscriptions.get(f"{obj}.{field}", ()):
+                    callback(obj, field, value)
+                for callback in self.subscriptions.get(obj, ()):
+                    callback(obj, field, value)
 
     def evaluate_state(self):
         # webhooks states: startup, ready, shutdown, error
@@ -384,26 +422,48 @@ class Printer:
     def device_has_power(self, device):
         return device in self.data and "power" in self.data[device]
 
-    def get_temp_store(self, device, section=False, results=0):
+    def get_temp_series(self, device, section, tier=0):
+        # Tier 0 is the moonraker store, the next ones the downsampled history
+        if device not in self.tempstore or section not in self.tempstore[device]:
+            return None
+        if tier == 0:
+            return self.tempstore[device][section]
+        return self.temphistory[device][section].tiers[tier - 1]
+
+    def get_temp_store(self, device, section=False, results=0, tier=0):
         if device not in self.tempstore:
             return False
 
         if section is not False:
-            if section not in self.tempstore[device]:
-                return False
-            if results == 0 or results >= len(self.tempstore[device][section]):
-                return self.tempstore[device][section]
-            return self.tempstore[device][section][-results:]
-
-        temp = {}
-        for section in self.tempstore[device]:
-            if results == 0 or results >= len(self.tempstore[device][section]):
-                temp[section] = self.tempstore[device][section]
-            temp[section] = self.tempstore[device][section][-results:]
-        return temp
-
-    def get_tempstore_size(self):
-        return self.tempstore_size
+            series = self.get_temp_series(device, section, tier)
+            return False if series is None else series.view(results)
+
+        return {
+            section: self.get_temp_series(device, section, tier).view(results) for section in self.tempstore[device]
+        }
+
+    def get_temp_store_max(self, device, section, results=0, tier=0):
+        series = self.get_temp_series(device, section, tier)
+        return None if series is None else series.max(results)
+
+    def get_tempstore_size(self, tier=0):
+        return self.tempstore_size if tier == 0 else self.history_tiers[tier - 1][1]
+
+    def get_tempstore_interval(self, tier=0):
+        # Seconds per sample
+        return 1 if tier == 0 else self.history_tiers[tier - 1][0]
+
+    def get_tempstore_tiers(self):
+        return 1 + len(self.history_tiers)
+
+    def get_tempstore_count(self, tier=0):
+        # The largest count of samples appended to the series of the tier since they were created,
+        # series added later have fewer. The graphs use it to draw only the new samples
+        return max(
+            (self.get_temp_series(device, section, tier).count
+             for device in self.tempstore for section in self.tempstore[device]),
+            default=0
+        )
 
     def get_temp_devices(self):
         if self.temp_devices is None:
@@ -446,22 +506,47 @@ class Printer:
         return self.tools.index(tool)
 
     def init_temp_store(self, tempstore):
+        tempstore = {
+            device: {x: TempSeries(self.tempstore_size, values) for x, values in tempstore[device].items()}
+            for device in tempstore
+        }
         if self.tempstore and set(self.tempstore) != set(tempstore):
             logging.debug("Tempstore has changed")
             self.tempstore = tempstore
             self.change_state(self.state)
         else:
             self.tempstore = tempstore
-        for device in self.tempstore:
-            for x in self.tempstore[device]:
-                length = len(self.tempstore[device][x])
-                if length < self.tempstore_size:
-                    for _ in range(1, self.tempstore_size - length):
-                        self.tempstore[device][x].insert(0, 0)
+        self.init_temp_history(tempstore)
         logging.info(f"Temp store: {list(self.tempstore)}")
         if not self.store_timeout:
             self.store_timeout = GLib.timeout_add_seconds(1, self._update_temp_store)
 
+    def init_temp_history(self, tempstore):
+        # The history outlives reconnections, it is only seeded from the store for new series.
+        # The existing ones get the samples of the store for the time they were not updated,
+        # and zeros for the part the store doesn't cover
+        now = time.monotonic()
+        missed = int(now - self.history_time) if self.history_time is not None else 0
+        tiers = []
+        previous = 1
+        for interval, capacity in self.history_tiers:
+            tiers.append((interval // previous, capacity))
+            previous = interval
+        history = {}
+        for device in tempstore:
+            history[device] = {}
+            for x, series in tempstore[device].items():
+                if x in self.temphistory.get(device, {}):
+                    history[device][x] = self.temphistory[device][x]
+                    recorded = min(missed, series.count, series.capacity)
+                    history[device][x].gap(missed - recorded)
+                    for value in series.view(recorded) if recorded else ():
+                        history[device][x].append(value)
+                else:
+                    history[device][x] = TempHistory(tiers, series.view(series.count) if series.count else None)
+        self.temphistory = history
+        self.history_time = now
+
     def config_section_exists(self, section):
         return section in self.get_config_section_list()
 
@@ -469,13 +554,14 @@ class Printer:
         if self.tempstore is None:
             return False
         for device in self.tempstore:
-            for x in self.tempstore[device]:
-                self.tempstore[device][x].pop(0)
+            for x, series in self.tempstore[device].items():
                 temp = self.get_stat(device, x[:-1])
                 if not temp:
                     # If the temperature is not available, set it to 0.
                     temp = 0
-                self.tempstore[device][x].append(temp)
+                series.append(temp)
+                self.temphistory[device][x].append(temp)
+        self.history_time = time.monotonic()
         return True
 
     def enable_spoolman(self):
@@ -0,0 +1,81 @@
+import builtins
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+# Startup profiler, enabled with --profile-startup
+# Import times are cumulative: a module includes the modules it imported for the first time
+enabled = False
+started = time.perf_counter()
+imports = {}
+phases = []
+marks = {}
+_original_import = builtins.__import__
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    if level != 0:
+        return _original_import(name, globals, locals, fromlist, level)
+    new = [module for module in (name, *(f"{name}.{item}" for item in fromlist or ())) if module not in sys.modules]
+    if not new:
+        return _original_import(name, globals, locals, fromlist, level)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        key = name if name in new else ", ".join(new)
+        imports.setdefault(key, (time.perf_counter() - start) * 1000)
+
+
+def enable():
+    global enabled
+    enabled = True
+    builtins.__import__ = _timed_import
+
+
+def elapsed():
+    return (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def phase(name):
+    if not enabled:
+        yield
+        return
+    start = elapsed()
+    try:
+        yield
+    finally:
+        phases.append({"name": name, "start_ms": round(start, 1), "ms": round(elapsed() - start, 1)})
+
+
+def mark(name):
+    if enabled and name not in marks:
+        marks[name] = round(elapsed(), 1)
+
+
+def write_report(path):
+    global enabled
+    if not enabled:
+        return False
+    enabled = False
+    builtins.__import__ = _original_import
+    report = {
+        "total_ms": round(elapsed(), 1),
+        "python": sys.version.split()[0],
+        "marks": marks,
+        "phases": phases,
+        "imports": [
+            {"module": module, "ms": round(ms, 1)}
+            for module, ms in sorted(imports.items(), key=lambda item: item[1], reverse=True)
+        ],
+    }
+    try:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Startup profile written to {path}: {report['total_ms']} ms until the first draw")
+    except OSError as e:
+        logging.error(f"Unable to write the startup profile {path}: {e}")
+    return False
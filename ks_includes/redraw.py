@@ -0,0 +1,56 @@
+import weakref
+
+
+class RedrawScheduler:
+    # Replaces queue_draw for the widgets that are redrawn on updates: the requests are coalesced on the frame clock,
+    # so a widget is drawn at most once per frame and at most max_fps times per second,
+    # while the screen is blanked nothing is drawn and the pending widgets wait until it wakes up
+    def __init__(self, config):
+        self.config = config
+        self.default_fps = config.getint("max_fps", 30)
+        self.intervals = {}
+        # widget: [name, tick callback id or None while paused]
+        self.pending = weakref.WeakKeyDictionary()
+        self.last = weakref.WeakKeyDictionary()
+        self.paused = False
+
+    def get_interval(self, name):
+        # Microseconds, like the frame time
+        if name not in self.intervals:
+            fps = self.config.getint(f"max_fps_{name}", self.default_fps) if name else self.default_fps
+            self.intervals[name] = 1000000 / fps if fps > 0 else 0
+        return self.intervals[name]
+
+    def queue(self, widget, name=None):
+        if widget in self.pending:
+            return
+        self.pending[widget] = [name, None if self.paused else widget.add_tick_callback(self.tick)]
+
+    def tick(self, widget, frame_clock):
+        entry = self.pending.get(widget)
+        if entry is None:
+            return False
+        now = frame_clock.get_frame_time()
+        if now - self.last.get(widget, 0) < self.get_interval(entry[0]):
+            return True
+        self.last[widget] = now
+        del self.pending[widget]
+        widget.queue_draw()
+        return False
+
+    def pause(self):
+        if self.paused:
+            return
+        self.paused = True
+        for widget, entry in list(self.pending.items()):
+            if entry[1] is not None:
+                widget.remove_tick_callback(entry[1])
+                entry[1] = None
+
+    def resume(self):
+        if not self.paused:
+            return
+        self.paused = False
+        for widget, entry in list(self.pending.items()):
+            if entry[1] is None:
+                entry[1] = widget.add_tick_callback(self.tick)
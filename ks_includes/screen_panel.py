@@ -1,11 +1,13 @@
 import datetime
 import logging
+import weakref
 
 import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Pango
 from ks_includes.KlippyGtk import find_widget
+from ks_includes.thumbnails import ThumbnailRequest
 
 
 class ScreenPanel:
@@ -28,6 +30,12 @@ class ScreenPanel:
         self.title = title
         self.devices = {}
         self.active_heaters = []
+        # Set while the panel is shown, between activate and deactivate
+        self.active = False
+        # request: cancel function, the callbacks of these must not run after the panel is destroyed
+        self.async_requests = weakref.WeakKeyDictionary()
+        # (printer, key, callback) of the printer subscriptions, removed when the panel is destroyed
+        self.subscriptions = []
         self.content = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, hexpand=True, vexpand=True)
         self.content.get_style_context().add_class("content")
         self._show_heater_power = self._config.get_main_config().getboolean('show_heater_power', False)
@@ -54,11 +62,74 @@ class ScreenPanel:
             return None
         width = width if width is not None else self._gtk.img_width
         height = height if height is not None else self._gtk.img_height
-        if loc[0] == "file":
-            return self._gtk.PixbufFromFile(loc[1], width, height)
-        if loc[0] == "http":
-            return self._gtk.PixbufFromHttp(loc[1], width, height)
-        return None
+        if loc[0] not in ("file", "http"):
+            return None
+        fileinfo = self._files.get_file_info(filename)
+        version = (filename, fileinfo.get('modified'), fileinfo.get('size'))
+        return self._gtk.thumbnails.get(loc, version, width, height)
+
+    def get_file_image_async(self, filename, width, height, small, callback, *args):
+        # Returns a request that can be cancelled, or None if the file has no thumbnail
+        if not self._files.has_thumbnail(filename):
+            return None
+        loc = self._files.get_thumbnail_location(filename, small)
+        if loc is None or loc[0] not in ("file", "http"):
+            return None
+        fileinfo = self._files.get_file_info(filename)
+        version = (filename, fileinfo.get('modified'), fileinfo.get('size'))
+        request = self._gtk.thumbnails.get_async(loc, version, width, height, callback, *args)
+        self.async_requests[request] = ThumbnailRequest.cancel
+        return request
+
+    def track_request(self, future):
+        # For the requests sent with the async methods of the REST client
+        if future is not None:
+            self.async_requests[future] = self._screen.apiclient.cancel
+        return future
+
+    def subscribe(self, key, callback):
+        self._printer.subscribe(key, callback)
+        self.subscriptions.append((self._printer, key, callback))
+
+    def unsubscribe_all(self):
+        for printer, key, callback in self.subscriptions:
+            printer.unsubscribe(key, callback)
+        self.subscriptions.clear()
+
+    def estimate_size(self):
+        # Rough estimate in bytes: a fixed cost per widget plus the pixel data of the images
+        size = 0
+        widgets = [self.content, *self.labels.values()]
+        seen = set()
+        while widgets:
+            widget = widgets.pop()
+            if not isinstance(widget, Gtk.Widget) or id(widget) in seen:
+                continue
+            seen.add(id(widget))
+            size += 2048
+            if isinstance(widget, Gtk.Image) and widget.get_storage_type() == Gtk.ImageType.PIXBUF:
+                pixbuf = widget.get_pixbuf()
+                size += pixbuf.get_rowstride() * pixbuf.get_height()
+            if isinstance(widget, Gtk.Container):
+                widgets.extend(widget.get_children())
+        return size
+
+    def destroy(self):
+        # The panel is being evicted, it will be constructed again the next time it is shown
+        if self.active and hasattr(self, "deactivate"):
+            self.deactivate()
+        self.active = False
+        for request, cancel in list(self.async_requests.items()):
+            cancel(request)
+        self.async_requests.clear()
+        self.unsubscribe_all()
+        for widget in self.labels.values():
+            if isinstance(widget, Gtk.Widget):
+                widget.destroy()
+        self.content.destroy()
+        self.labels.clear()
+        self.control.clear()
+        self.devices.clear()
 
     def menu_item_clicked(self, widget, item):
         panel_args = {}
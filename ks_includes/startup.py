@@ -0,0 +1,91 @@
+import logging
+import time
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+
+
+class StartupInitializer:
+    # Sends the startup requests over the websocket at the same time and runs every step
+    # as soon as the responses (or steps) it depends on are available.
+    # A request without a response after timeout seconds fails like an error response,
+    # so the steps go through the usual retry path
+    def __init__(self, ws, timeout=10):
+        self._ws = ws
+        self.timeout = timeout
+        self.timers = {}
+        self.start = time.perf_counter()
+        self.results = {}
+        self.steps = []
+        self.pending = set()
+        self.timings = {}
+        self.cancelled = False
+
+    def request(self, name, method, params=None):
+        self.pending.add(name)
+        if not self._ws.send_method(method, params or {}, self._response, name, time.perf_counter()):
+            logging.error(f"Startup: unable to send {method}")
+            self.pending.discard(name)
+            self.results[name] = False
+            return
+        self.timers[name] = GLib.timeout_add_seconds(self.timeout, self._timeout, name, method)
+
+    def step(self, name, requires, func):
+        # func receives the results of requires in order, its return value becomes the result of the step
+        self.steps.append((name, requires, func))
+        self._run_steps()
+
+    def cancel(self):
+        self.cancelled = True
+        self.steps.clear()
+        for timer in self.timers.values():
+            GLib.source_remove(timer)
+        self.timers.clear()
+
+    def _timeout(self, name, method):
+        self.timers.pop(name, None)
+        if self.cancelled or name not in self.pending:
+            return False
+        logging.error(f"Startup: {method} timed out after {self.timeout} s")
+        self.pending.discard(name)
+        self.results[name] = False
+        self._run_steps()
+        return False
+
+    def _response(self, response, method, params, name, sent):
+        if self.cancelled or name not in self.pending:
+            return
+        self.pending.discard(name)
+        if name in self.timers:
+            GLib.source_remove(self.timers.pop(name))
+        self.timings[name] = (time.perf_counter() - sent) * 1000
+        if "result" in response:
+            self.results[name] = response["result"]
+        else:
+            logging.debug(f"Startup: {method} failed {response.get('error')}")
+            self.results[name] = False
+        self._run_steps()
+
+    def _run_steps(self):
+        ready = True
+        while ready and not self.cancelled:
+            ready = [step for step in self.steps if all(r in self.results for r in step[1])]
+            for step in ready:
+                name, requires, func = step
+                if self.cancelled:
+                    return
+                self.steps.remove(step)
+                start = time.perf_counter()
+                self.results[name] = func(*[self.results[r] for r in requires])
+                self.timings[name] = (time.perf_counter() - start) * 1000
+        if not self.cancelled and not self.steps and not self.pending:
+            self.log_timings()
+
+    def elapsed(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def log_timings(self):
+        breakdown = ", ".join(f"{name} {ms:.0f}" for name, ms in self.timings.items())
+        logging.info(f"Startup finished in {self.elapsed():.0f} ms ({breakdown})")
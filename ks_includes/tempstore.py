@@ -0,0 +1,93 @@
+from array import array
+from collections import deque
+
+
+class TempSeries:
+    # Fixed-capacity circular buffer of float samples.
+    # Every sample is written twice (at pos and pos + capacity), so the last `capacity`
+    # samples are always contiguous and can be handed out as a memoryview without copying.
+    # The maximum of the whole buffer is kept in a monotonic deque of (sample number, value).
+    __slots__ = ('capacity', 'count', '_buf', '_pos', '_maxima')
+
+    def __init__(self, capacity, values=None):
+        self.capacity = max(int(capacity), 1)
+        self._buf = array('d', bytes(16 * self.capacity))
+        self._pos = 0
+        self.count = 0
+        self._maxima = deque()
+        if values:
+            self.extend(values)
+
+    def __len__(self):
+        return self.capacity
+
+    def append(self, value):
+        pos = self._pos
+        self._buf[pos] = self._buf[pos + self.capacity] = value
+        self._pos = pos + 1 if pos + 1 < self.capacity else 0
+        maxima = self._maxima
+        while maxima and maxima[-1][1] <= value:
+            maxima.pop()
+        maxima.append((self.count, value))
+        self.count += 1
+        if maxima[0][0] <= self.count - self.capacity - 1:
+            maxima.popleft()
+
+    def extend(self, values):
+        for value in values[-self.capacity:]:
+            self.append(value or 0)
+
+    def last(self):
+        return self._buf[self._pos + self.capacity - 1]
+
+    def max(self, results=0):
+        if 0 < results < self.capacity:
+            return max(self.view(results))
+        if not self._maxima:
+            return 0.0
+        # Until the buffer is full it still holds the initial zeros
+        return self._maxima[0][1] if self.count >= self.capacity else max(self._maxima[0][1], 0.0)
+
+    def view(self, results=0):
+        end = self._pos + self.capacity
+        if results <= 0 or results >= self.capacity:
+            return memoryview(self._buf)[self._pos:end]
+        return memoryview(self._buf)[end - results:end]
+
+
+class TempHistory:
+    # Downsampled copies of a series with a fixed size, every tier stores the mean
+    # of `factor` consecutive samples of the previous one (the first tier is fed the raw samples)
+    __slots__ = ('tiers', 'factors', '_sums', '_counts')
+
+    def __init__(self, tiers, values=None):
+        # tiers: ((factor, capacity), ...)
+        self.tiers = [TempSeries(capacity) for factor, capacity in tiers]
+        self.factors = [max(int(factor), 1) for factor, capacity in tiers]
+        self._sums = [0.0] * len(tiers)
+        self._counts = [0] * len(tiers)
+        if values:
+            for value in values:
+                self.append(value or 0)
+
+    def append(self, value):
+        for i, factor in enumerate(self.factors):
+            self._sums[i] += value
+            self._counts[i] += 1
+            if self._counts[i] < factor:
+                return
+            value = self._sums[i] / factor
+            self._sums[i] = 0.0
+            self._counts[i] = 0
+            self.tiers[i].append(value)
+
+    def gap(self, samples):
+        # `samples` raw samples are missing, every tier gets zeros for the time they cover,
+        # like the values that were not available
+        interval = 1
+        for i, factor in enumerate(self.factors):
+            interval *= factor
+            self._sums[i] = 0.0
+            self._counts[i] = 0
+            for _ in range(min(samples // interval, self.tiers[i].capacity)):
+                self.tiers[i].append(0)
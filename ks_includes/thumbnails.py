@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+from ks_includes.files import cache_dir
+
+
+class ThumbnailRequest:
+    __slots__ = ('cancelled', '__weakref__')
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class ThumbnailCache:
+    # Two level cache for gcode thumbnails:
+    # memory: LRU of scaled pixbufs bounded by their size in bytes
+    # disk: the PNGs fetched from moonraker, keyed by the file path, modification time and size
+    def __init__(self, gtk, max_memory=16 * 1024 * 1024, max_disk=64 * 1024 * 1024):
+        self._gtk = gtk
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.disk_dir = os.path.join(cache_dir, "thumbnails")
+        self.disk_size = None
+        # The workers save and prune at the same time
+        self.disk_lock = threading.Lock()
+        # Thumbnails of local files aren't cached on disk, their loads are counted apart
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "local": 0}
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnails")
+
+    def get(self, location, version, width, height):
+        # location is ['file' | 'http', path], version identifies the gcode (path, modified, size)
+        key = (location[1], version, int(width), int(height))
+        pixbuf = self.memory.get(key)
+        if pixbuf is not None:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return pixbuf
+        pixbuf, tier = self._load(location, version, width, height)
+        self.stats[tier] += 1
+        if pixbuf is not None:
+            self.add(key, pixbuf)
+        return pixbuf
+
+    def get_async(self, location, version, width, height, callback, *args):
+        # Downloads and scales in the worker pool, callback(pixbuf, *args) runs in the main loop
+        # unless the returned request gets cancelled first
+        request = ThumbnailRequest()
+        key = (location[1], version, int(width), int(height))
+        pixbuf = self.memory.get(key)
+        if pixbuf is not None:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            callback(pixbuf, *args)
+            return request
+        self.executor.submit(self._load_worker, request, key, location, version, width, height, callback, args)
+        return request
+
+    def _load_worker(self, request, key, location, version, width, height, callback, args):
+        if request.cancelled:
+            return
+        try:
+            pixbuf, tier = self._load(location, version, width, height)
+        except Exception as e:
+            logging.exception(f"Error loading thumbnail {location[1]}: {e}")
+            return
+        GLib.idle_add(self._deliver, request, key, pixbuf, tier, callback, args)
+
+    def _deliver(self, request, key, pixbuf, tier, callback, args):
+        self.stats[tier] += 1
+        if pixbuf is not None:
+            self.add(key, pixbuf)
+            if not request.cancelled:
+                callback(pixbuf, *args)
+        return False
+
+    def _load(self, location, version, width, height):
+        if location[0] == "file":
+            return self._gtk.PixbufFromFile(location[1], width, height), "local"
+        data = self.load(location[1], version)
+        if data is not None:
+            return self._gtk.PixbufFromBytes(data, width, height), "disk_hits"
+        data = self._gtk.screen.apiclient.get_thumbnail_stream(location[1])
+        if data is False:
+            return None, "misses"
+        self.save(location[1], version, data)
+        return self._gtk.PixbufFromBytes(data, width, height), "misses"
+
+    def add(self, key, pixbuf):
+        size = pixbuf.get_byte_length()
+        if size > self.max_memory:
+            return
+        self.memory[key] = pixbuf
+        self.memory_size += size
+        while self.memory_size > self.max_memory:
+            _, old = self.memory.popitem(last=False)
+            self.memory_size -= old.get_byte_length()
+
+    def clear(self):
+        self.memory.clear()
+        self.memory_size = 0
+
+    def get_stats(self):
+        return {
+            **self.stats,
+            "memory_items": len(self.memory),
+            "memory_bytes": self.memory_size,
+            "disk_bytes": self.get_disk_size(),
+        }
+
+    def get_disk_size(self):
+        with self.disk_lock:
+            return self.disk_size or 0
+
+    def _disk_path(self, path, version):
+        digest = hashlib.sha1(f"{self._gtk.screen.apiclient.endpoint}|{path}|{version}".encode()).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.png")
+
+    def load(self, path, version):
+        filename = self._disk_path(path, version)
+        try:
+            with open(filename, "rb") as f:
+                data = f.read()
+            # The modification time is used to evict the least recently used thumbnails
+            os.utime(filename)
+            return data
+        except OSError:
+            return None
+
+    def save(self, path, version, data):
+        with self.disk_lock:
+            try:
+                os.makedirs(self.disk_dir, exist_ok=True)
+                with open(self._disk_path(path, version), "wb") as f:
+                    f.write(data)
+            except OSError as e:
+                logging.error(f"Unable to save thumbnail {path}: {e}")
+                return
+            if self.disk_size is None:
+                self.disk_size = sum(entry.stat().st_size for entry in os.scandir(self.disk_dir))
+            else:
+                self.disk_size += len(data)
+            if self.disk_size > self.max_disk:
+                self.prune_disk()
+
+    def prune_disk(self):
+        # Removes the oldest thumbnails until the cache is back to 3/4 of the limit, called with disk_lock held
+        entries = sorted(os.scandir(self.disk_dir), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.disk_size <= self.max_disk * .75:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.disk_size -= size
+            except OSError as e:
+                logging.error(f"Unable to remove thumbnail {entry.path}: {e}")
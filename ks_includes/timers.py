@@ -0,0 +1,97 @@
+import logging
+import time
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib
+
+
+class Timer:
+    __slots__ = ('interval', 'seconds', 'callback', 'args', 'visible_only', 'source', 'last')
+
+    def __init__(self, interval, seconds, callback, args, visible_only):
+        self.interval = interval
+        self.seconds = seconds
+        self.callback = callback
+        self.args = args
+        self.visible_only = visible_only
+        self.source = None
+        self.last = time.monotonic()
+
+    def period(self):
+        return self.interval if self.seconds else self.interval / 1000
+
+
+class TimerRegistry:
+    # The periodic timers of the UI, used like GLib.timeout_add and GLib.timeout_add_seconds.
+    # Timers added with visible_only are suspended while the screen is blanked,
+    # when it wakes up the ones that missed a run are run right away and then continue as usual
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+        self.blanked = False
+
+    def add(self, interval, callback, *args, visible_only=False):
+        return self._add(Timer(interval, False, callback, args, visible_only))
+
+    def add_seconds(self, interval, callback, *args, visible_only=False):
+        return self._add(Timer(interval, True, callback, args, visible_only))
+
+    def _add(self, timer):
+        self.next_id += 1
+        self.timers[self.next_id] = timer
+        if not (timer.visible_only and self.blanked):
+            self._start(self.next_id, timer)
+        return self.next_id
+
+    def _start(self, timer_id, timer):
+        if timer.seconds:
+            timer.source = GLib.timeout_add_seconds(timer.interval, self._run, timer_id)
+        else:
+            timer.source = GLib.timeout_add(timer.interval, self._run, timer_id)
+
+    def _run(self, timer_id):
+        timer = self.timers.get(timer_id)
+        if timer is None:
+            return False
+        timer.last = time.monotonic()
+        try:
+            keep = timer.callback(*timer.args)
+        except Exception as e:
+            logging.exception(f"Timer {timer.callback} failed: {e}")
+            keep = False
+        if not keep and self.timers.get(timer_id) is timer:
+            del self.timers[timer_id]
+            timer.source = None
+        return bool(keep)
+
+    def remove(self, timer_id):
+        timer = self.timers.pop(timer_id, None)
+        if timer is not None and timer.source is not None:
+            GLib.source_remove(timer.source)
+            timer.source = None
+
+    def suspend(self):
+        if self.blanked:
+            return
+        self.blanked = True
+        suspended = 0
+        for timer in self.timers.values():
+            if timer.visible_only and timer.source is not None:
+                GLib.source_remove(timer.source)
+                timer.source = None
+                suspended += 1
+        logging.debug(f"Suspended {suspended} timers")
+
+    def resume(self):
+        if not self.blanked:
+            return
+        self.blanked = False
+        now = time.monotonic()
+        for timer_id, timer in list(self.timers.items()):
+            if not timer.visible_only or timer.source is not None:
+                continue
+            if now - timer.last >= timer.period() and not self._run(timer_id):
+                continue
+            self._start(timer_id, timer)
@@ -1,7 +1,38 @@
+import logging
+import math
+import sys
+
 import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
+import cairo
+from cairo import Context as cairoContext
+from ks_includes.meshmodel import MeshModel
+
+# Deviations of COLOR_RANGE or more get the full color
+COLOR_RANGE = 0.25
+COLOR_STEPS = 255
+
+
+def _color(value):
+    color = min(1, max(0, 1 - 1 / COLOR_RANGE * abs(value)))
+    if value > 0:
+        return (1, color, color)
+    if value < 0:
+        return (color, color, 1)
+    return (1, 1, 1)
+
+
+# Colors from -COLOR_RANGE to COLOR_RANGE, the middle entry is 0
+COLOR_LUT = tuple(_color(COLOR_RANGE * (2 * i / (COLOR_STEPS - 1) - 1)) for i in range(COLOR_STEPS))
+# The same colors as FORMAT_RGB24 pixels, which are native endian 32 bit integers
+COLOR_PIXELS = tuple(
+    bytes(round(c * 255) for c in ((b, g, r, 1) if sys.byteorder == "little" else (1, r, g, b)))
+    for r, g, b in COLOR_LUT
+)
+# Samples per side of the interpolated heatmap, cairo smooths the rest when scaling it
+HEATMAP_SIZE = 120
 
 
 class BedMap(Gtk.DrawingArea):
@@ -19,83 +50,65 @@ class BedMap(Gtk.DrawingArea):
         self.mesh_min = [0, 0]
         self.mesh_max = [0, 0]
         self.mesh_radius = 0
+        self.surface = None
+        self.surface_key = None
+        self.mesh = None
+        self.view = None
 
     def update_bm(self, bm, radius=None):
+        self.surface = None
+        self.mesh = None
         if not bm:
             self.bm = None
             return
 
-        for key, value in bm.items():
-            if key == 'profiles':
-                continue
         if radius:
             self.mesh_radius = float(radius)
+        mesh_min, mesh_max = self.mesh_min, self.mesh_max
         if 'mesh_min' in bm:
-            self.mesh_min = bm['mesh_min']
+            mesh_min = bm['mesh_min']
         elif 'min_x' in bm and 'min_y' in bm:
-            self.mesh_min = (float(bm['min_x']), float(bm['min_y']))
+            mesh_min = (float(bm['min_x']), float(bm['min_y']))
         if 'mesh_max' in bm:
-            self.mesh_max = bm['mesh_max']
+            mesh_max = bm['mesh_max']
         elif 'max_x' in bm and 'max_y' in bm:
-            self.mesh_max = (float(bm['max_x']), float(bm['max_y']))
+            mesh_max = (float(bm['max_x']), float(bm['max_y']))
         if 'probed_matrix' in bm:
-            bm = bm['probed_matrix']
+            matrix = bm['probed_matrix']
         elif 'points' in bm:
-            bm = self.transform_points_to_matrix(bm['points'])
+            matrix = MeshModel.parse_points(bm['points'])
         else:
             self.bm = None
             return
+        if not matrix or not matrix[0]:
+            self.bm = None
+            return
 
-        if self.invert_x and self.invert_y:
-            self.rotation = (self.rotation + 180) % 360
-            self.invert_x = self.invert_y = False
-        if self.invert_x:
-            new_max = [self.mesh_min[0], self.mesh_max[1]]
-            new_min = [self.mesh_max[0], self.mesh_min[1]]
-            self.mesh_max = new_max
-            self.mesh_min = new_min
-            self.bm = [list(reversed(b)) for b in list(reversed(bm))]
-        if self.invert_y:
-            new_max = [self.mesh_max[0], self.mesh_min[1]]
-            new_min = [self.mesh_min[0], self.mesh_max[1]]
-            self.mesh_max = new_max
-            self.mesh_min = new_min
-            self.bm = list(bm)
-        else:
-            self.bm = list(reversed(bm))
-
-        if self.rotation in (90, 180, 270):
-            self.bm = self.rotate_matrix(self.bm)
-
-    @staticmethod
-    def transform_points_to_matrix(points):
-        rows = points.strip().split('\n')
-        return [list(map(float, row.split(','))) for row in rows]
-
-    def rotate_matrix(self, matrix):
-        if self.rotation == 90:
-            new_max = [self.mesh_max[1], self.mesh_min[0]]
-            new_min = [self.mesh_min[1], self.mesh_max[0]]
-            self.mesh_max = new_max
-            self.mesh_min = new_min
-            return [list(row) for row in zip(*matrix[::-1])]
-        elif self.rotation == 180:
-            new_max = [self.mesh_min[0], self.mesh_min[1]]
-            new_min = [self.mesh_max[0], self.mesh_max[1]]
-            self.mesh_max = new_max
-            self.mesh_min = new_min
-            return [list(row)[::-1] for row in matrix[::-1]]
-        elif self.rotation == 270:
-            new_max = [self.mesh_min[1], self.mesh_max[0]]
-            new_min = [self.mesh_max[1], self.mesh_min[0]]
-
-            self.mesh_max = new_max
-            self.mesh_min = new_min
-            return [list(row) for row in zip(*matrix)][::-1]
+        self.mesh = MeshModel(matrix, mesh_min, mesh_max)
+        self.view = self.mesh.display_view(self.rotation, self.invert_x, self.invert_y)
+        self.bm = self.view.to_rows()
+        self.mesh_min, self.mesh_max = self.view.mesh_min, self.view.mesh_max
+        stats = self.mesh.get_stats()
+        logging.info(
+            f"Mesh {self.mesh.columns}x{self.mesh.rows} range: {stats['range']:.3f} std: {stats['std']:.3f} "
+            f"plane deviation: {stats['plane_deviation']:.3f}"
+        )
 
     def draw_graph(self, da, ctx):
+        # The map is rendered once and painted from the surface until the mesh, the orientation or the size change
         width = da.get_allocated_width()
         height = da.get_allocated_height()
+        scale = da.get_scale_factor()
+        key = (width, height, scale)
+        if self.surface is None or self.surface_key != key:
+            self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width * scale, height * scale)
+            self.surface.set_device_scale(scale, scale)
+            self.surface_key = key
+            self.render(cairoContext(self.surface), width, height)
+        ctx.set_source_surface(self.surface, 0, 0)
+        ctx.paint()
+
+    def render(self, ctx, width, height):
         gwidth = int(width - self.font_size * 2.2)
         gheight = int(height - self.font_size * 1.8)
         # Styling
@@ -136,6 +149,10 @@ class BedMap(Gtk.DrawingArea):
 
         rows = len(self.bm)
         columns = len(self.bm[0])
+        if self.mesh_radius <= 0 and min(rows, columns) > 1 and gwidth / columns < self.font_size * 3:
+            # The cells are too small for the values, a smooth heatmap is more readable
+            self.render_heatmap(ctx, self.font_size * 2.2, gwidth, gheight)
+            return
         for i, row in enumerate(self.bm):
             ty = (gheight / rows * i)
             by = ty + gheight / rows
@@ -165,6 +182,28 @@ class BedMap(Gtk.DrawingArea):
                 ctx.show_text(f"{column:.2f}")
                 ctx.stroke()
 
+    def render_heatmap(self, ctx, x, gwidth, gheight):
+        factor = max(1, min(8, HEATMAP_SIZE // max(self.view.rows, self.view.columns)))
+        samples = self.view.upsample(factor)
+        height, width = len(samples), len(samples[0])
+        data = bytearray(b"".join(COLOR_PIXELS[self.color_index(value)] for row in samples for value in row))
+        image = cairo.ImageSurface.create_for_data(data, cairo.FORMAT_RGB24, width, height, width * 4)
+        # The first and last samples are at the center of the edge cells
+        cell_width = gwidth / self.view.columns
+        cell_height = gheight / self.view.rows
+        sx = (gwidth - cell_width) / (width - 1)
+        sy = (gheight - cell_height) / (height - 1)
+        ctx.save()
+        ctx.rectangle(x, 0, gwidth, gheight)
+        ctx.clip()
+        ctx.translate(x + (cell_width - sx) / 2, (cell_height - sy) / 2)
+        ctx.scale(sx, sy)
+        ctx.set_source_surface(image, 0, 0)
+        ctx.get_source().set_extend(cairo.EXTEND_PAD)
+        ctx.get_source().set_filter(cairo.FILTER_GOOD)
+        ctx.paint()
+        ctx.restore()
+
     @staticmethod
     def round_bed_skip(i, j, row, rows, columns):
         if columns <= 3:
@@ -178,18 +217,20 @@ class BedMap(Gtk.DrawingArea):
         return False
 
     @staticmethod
-    def colorbar(value: float):
-        rmax = 0.25
-        color = min(1, max(0, 1 - 1 / rmax * abs(value)))
-        if value > 0:
-            return [1, color, color]
-        if value < 0:
-            return [color, color, 1]
-        return [1, 1, 1]
+    def color_index(value: float):
+        if value == 0 or math.isnan(value):
+            return COLOR_STEPS // 2
+        return round((min(max(value, -COLOR_RANGE), COLOR_RANGE) / COLOR_RANGE + 1) * (COLOR_STEPS - 1) / 2)
+
+    @classmethod
+    def colorbar(cls, value: float):
+        return COLOR_LUT[cls.color_index(value)]
 
     def set_inversion(self, x=False, y=False):
         self.invert_x = x
         self.invert_y = y
+        self.surface = None
 
     def set_rotation(self, rotation=0):
         self.rotation = rotation
+        self.surface = None
@@ -5,7 +5,8 @@ import math
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gdk, Gtk, GLib
+from gi.repository import Gdk, Gtk
+import cairo
 from cairo import Context as cairoContext
 
 
@@ -27,18 +28,29 @@ class HeaterGraph(Gtk.DrawingArea):
         self.connect('button_press_event', self.event_cb)
         self.font_size = round(font_size * 0.75)
         self.fullscreen = fullscreen
-        if fullscreen:
-            GLib.timeout_add_seconds(1, self.update_graph)
+        # The fullscreen graph isn't updated by a panel, it has its own timer until it's closed
+        self.timer = screen.timers.add_seconds(1, self.update_graph, visible_only=True) if fullscreen else None
+        self.connect('destroy', self.stop_updates)
         self.fs_graph = None
         self.max_temp = 0
         for section in self.printer.config:
             if "max_temp" in self.printer.get_config_section(section):
                 self.max_temp = max(float(self.printer.get_config_section(section)["max_temp"]), self.max_temp)
         self.max_temp = min(self.max_temp, 999)
+        self.background = self.background_key = None
+        self.series = self.series_key = None
+        self.series_count = self.series_shift = 0
+        # Tier of the temperature history that is shown, 0 is the 1 s store
+        self.tier = 0
 
     def update_graph(self):
-        self.queue_draw()
-        return self.fullscreen
+        self._screen.redraw.queue(self, "graph")
+        return True
+
+    def stop_updates(self, *args):
+        if self.timer is not None:
+            self._screen.timers.remove(self.timer)
+            self.timer = None
 
     def show_fullscreen_graph(self):
         self.fs_graph = HeaterGraph(self._screen, self.printer, self.config, self.font_size * 2,
@@ -47,12 +59,17 @@ class HeaterGraph(Gtk.DrawingArea):
 
     def close_fullscreen_graph(self, dialog, response_id):
         logging.info("Closing graph")
-        self.fs_graph.fullscreen = False
+        self.fs_graph.stop_updates()
+        self.fs_graph = None
         self._gtk.remove_dialog(dialog)
 
     def event_cb(self, da, ev):
         if self.fullscreen:
             logging.info(f"Graph area: {ev.x} {ev.y}")
+            # Every tap zooms out to the next tier of the history, then back to the start
+            self.tier = (self.tier + 1) % self.printer.get_tempstore_tiers()
+            logging.info(f"Showing {self.printer.get_tempstore_interval(self.tier)} s per sample")
+            self._screen.redraw.queue(self, "graph")
         else:
             self.show_fullscreen_graph()
             logging.info("Entering Fullscreen")
@@ -72,12 +89,12 @@ class HeaterGraph(Gtk.DrawingArea):
         if self.config.get_config()["main"].getboolean("auto_scale_temp_chart", True):
             for device in self.store:
                 if self.store[device]['show']:
-                    temp = self.printer.get_temp_store(device, "temperatures", data_points)
-                    if isinstance(temp, list):
-                        mnum.append(max([v for v in temp if v is not None]))
-                    target = self.printer.get_temp_store(device, "targets", data_points)
-                    if isinstance(target, list):
-                        mnum.append(max([v for v in target if v is not None]))
+                    temp = self.printer.get_temp_store_max(device, "temperatures", data_points, self.tier)
+                    if temp is not None:
+                        mnum.append(temp)
+                    target = self.printer.get_temp_store_max(device, "targets", data_points, self.tier)
+                    if target is not None:
+                        mnum.append(target)
         else:
             for device in self.printer.get_temp_devices():
                 mnum.append(float(self.printer.get_config_section(device)["max_temp"]))
@@ -93,15 +110,14 @@ class HeaterGraph(Gtk.DrawingArea):
         width = da.get_allocated_width() - 15
         height = da.get_allocated_height() - self.font_size * 2
         gsize = [[x, y], [width, height]]
+        if width <= x or height <= y:
+            return
 
-        ctx.set_source_rgb(.5, .5, .5)
         ctx.set_line_width(1)
         ctx.set_tolerance(1)
 
-        ctx.rectangle(x, y, width - x, height - y)
-
         graph_width = gsize[1][0] - gsize[0][0]
-        points_per_pixel = self.printer.get_tempstore_size() / graph_width
+        points_per_pixel = self.printer.get_tempstore_size(self.tier) / graph_width
         data_points = int(round(graph_width * points_per_pixel, 0))
         max_num = self.get_max_num(data_points)
         if points_per_pixel == 0:
@@ -109,58 +125,144 @@ class HeaterGraph(Gtk.DrawingArea):
             return
         d_width = 1 / points_per_pixel
 
-        d_height_scale = self.graph_lines(ctx, gsize, max_num)
-        self.graph_time(ctx, gsize, points_per_pixel)
+        d_height_scale = self.draw_background(ctx, gsize, max_num, da.get_scale_factor())
+        self.graph_time(ctx, gsize, points_per_pixel, self.printer.get_tempstore_interval(self.tier))
+        self.draw_series(ctx, gsize, d_height_scale, d_width, data_points, da.get_scale_factor())
+
+    @staticmethod
+    def create_surface(width, height, scale):
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, math.ceil(width * scale), math.ceil(height * scale))
+        surface.set_device_scale(scale, scale)
+        return surface
+
+    def draw_background(self, ctx: cairoContext, gsize, max_num, scale):
+        # The frame, the temperature lines and their labels only change with the size or the scale
+        nscale, lines = self.graph_scale(max_num)
+        hscale = (gsize[1][1] - gsize[0][1]) / (lines * nscale)
+        key = (gsize[0][0], gsize[1][0], gsize[1][1], scale, nscale, lines)
+        if self.background is None or self.background_key != key:
+            self.background = self.create_surface(gsize[1][0] + 1, gsize[1][1] + 1, scale)
+            bctx = cairoContext(self.background)
+            bctx.set_line_width(1)
+            bctx.set_tolerance(1)
+            bctx.set_source_rgb(.5, .5, .5)
+            bctx.rectangle(gsize[0][0], gsize[0][1], gsize[1][0] - gsize[0][0], gsize[1][1] - gsize[0][1])
+            bctx.stroke()
+            self.graph_lines(bctx, gsize, nscale, lines, hscale)
+            self.background_key = key
+        ctx.set_source_surface(self.background, 0, 0)
+        ctx.paint()
+        return hscale
 
+    def draw_series(self, ctx: cairoContext, gsize, hscale, swidth, data_points, scale):
+        # The series are kept in a surface that scrolls left as samples are added,
+        # only the segments of the new samples are drawn, x is aligned to whole pixels of the scroll
+        series = []
         for name in self.store:
             if not self.store[name]['show']:
                 continue
             for dev_type in self.store[name]:
-                if d := self.printer.get_temp_store(name, dev_type, data_points):
-                    self.graph_data(
-                        ctx, d, gsize, d_height_scale, d_width, self.store[name][dev_type]["rgb"],
-                        self.store[name][dev_type]["dashed"], self.store[name][dev_type]["fill"]
-                    )
+                if d := self.printer.get_temp_store(name, dev_type, data_points, self.tier):
+                    obj = self.store[name][dev_type]
+                    # Until the series is full, the start of the buffer is padding
+                    filled = data_points - min(self.printer.get_temp_series(name, dev_type, self.tier).count,
+                                               data_points)
+                    series.append((d, filled, obj["rgb"], obj["dashed"], obj["fill"]))
+        key = (
+            gsize[0][0], gsize[0][1], gsize[1][0], gsize[1][1], scale, hscale, data_points, self.tier,
+            id(self.printer.tempstore), tuple((tuple(rgb), dashed, fill) for d, filled, rgb, dashed, fill in series)
+        )
+        count = self.printer.get_tempstore_count(self.tier)
+        new = count - self.series_count
+        shift = math.floor((count - data_points) * swidth)
+        if self.series is None or self.series_key != key or not 0 <= new < data_points - 1:
+            self.series = self.create_surface(gsize[1][0] - gsize[0][0] + 1, gsize[1][1] + 1, scale)
+            first = 0
+        elif new > 0:
+            scrolled = self.create_surface(gsize[1][0] - gsize[0][0] + 1, gsize[1][1] + 1, scale)
+            sctx = cairoContext(scrolled)
+            sctx.set_operator(cairo.OPERATOR_SOURCE)
+            sctx.set_source_surface(self.series, self.series_shift - shift, 0)
+            sctx.paint()
+            self.series = scrolled
+            first = data_points - new - 1
+        else:
+            first = None
+        if first is not None:
+            sctx = cairoContext(self.series)
+            sctx.set_line_width(1)
+            sctx.set_tolerance(1)
+            x_start = (count - data_points) * swidth
+            for d, filled, rgb, dashed, fill in series:
+                self.graph_data(sctx, d, max(first, filled), gsize, hscale, swidth, x_start, shift, rgb, dashed, fill)
+        self.series_key = key
+        self.series_count = count
+        self.series_shift = shift
+        ctx.set_source_surface(self.series, gsize[0][0], 0)
+        ctx.paint()
 
     @staticmethod
-    def graph_data(ctx: cairoContext, data, gsize, hscale, swidth, rgb, dashed=False, fill=False):
+    def decimate(data, first, x_start, swidth):
+        # Yields (x, value) for data[first:], when there is more than one sample per pixel column
+        # only the minimum and the maximum of each column are kept, so spikes are still visible
+        if swidth >= 1:
+            for i in range(first, len(data)):
+                yield x_start + i * swidth, data[i]
+            return
+        end = len(data)
+        column = math.floor(x_start + first * swidth)
+        i = first
+        while i < end:
+            column += 1
+            j = min(max(math.ceil((column - x_start) / swidth), i + 1), end)
+            if j - i < 3:
+                for k in range(i, j):
+                    yield x_start + k * swidth, data[k]
+            else:
+                chunk = data[i:j]
+                low, high = min(chunk), max(chunk)
+                if chunk[0] > chunk[-1]:
+                    low, high = high, low
+                yield x_start + i * swidth, low
+                yield x_start + (j - 1) * swidth, high
+            i = j
+
+    @classmethod
+    def graph_data(cls, ctx: cairoContext, data, first, gsize, hscale, swidth, x_start, shift, rgb, dashed=False,
+                   fill=False):
+        # Draws data[first:], x_start is the absolute x of data[0] and shift the one of the surface
         if fill:
             ctx.set_source_rgba(rgb[0], rgb[1], rgb[2], .25)
             ctx.set_dash([1, 0])
         elif dashed:
             ctx.set_source_rgba(rgb[0], rgb[1], rgb[2], .5)
-            ctx.set_dash([10, 5])
+            # Keep the dashes in place while scrolling
+            ctx.set_dash([10, 5], (x_start + first * swidth) % 15)
         else:
             ctx.set_source_rgba(rgb[0], rgb[1], rgb[2], 1)
             ctx.set_dash([1, 0])
-        d_len = len(data) - 1
-
-        start_x = gsize[1][0]
-        end_x = gsize[0][0]
-
-        for i, d in enumerate(data):
-            if d is None:
-                continue
-
-            p_x = i * swidth + gsize[0][0] if i != d_len else gsize[1][0] - 1
-            start_x = min(start_x, p_x)
-            end_x = max(end_x, p_x)
+        start_x = end_x = None
+        for p_x, d in cls.decimate(data, first, x_start, swidth):
+            p_x -= shift
+            if start_x is None:
+                start_x = p_x
+            end_x = p_x
             if dashed:  # d between 0 and 1
                 p_y = gsize[1][1] - (d * (gsize[1][1] - gsize[0][1]))
             else:
                 p_y = max(gsize[0][1], min(gsize[1][1], gsize[1][1] - 1 - (d * hscale)))
-            if i == 0:
-                ctx.move_to(gsize[0][0], p_y)
             ctx.line_to(p_x, p_y)
+        if start_x is None:
+            return
         if fill:
             ctx.stroke_preserve()
-            ctx.line_to(end_x - 1, gsize[1][1] - 1)
-            ctx.line_to(start_x + 1, gsize[1][1] - 1)
+            ctx.line_to(end_x, gsize[1][1] - 1)
+            ctx.line_to(start_x, gsize[1][1] - 1)
             ctx.fill()
         else:
             ctx.stroke()
 
-    def graph_lines(self, ctx: cairoContext, gsize, max_num):
+    def graph_scale(self, max_num):
         max_num = min(max_num, self.max_temp)
         if (self.config.get_config()["main"].getboolean("auto_scale_temp_chart", True)
                 or self.config.get_config()["main"].getboolean("auto_adjust_temp_chart_indices", True)):
@@ -169,11 +271,12 @@ class HeaterGraph(Gtk.DrawingArea):
                 nscale += 10
         else:
             nscale = 50
-        r = int(max_num / nscale) + 1
-        hscale = (gsize[1][1] - gsize[0][1]) / (r * nscale)
+        return nscale, int(max_num / nscale) + 1
+
+    def graph_lines(self, ctx: cairoContext, gsize, nscale, lines, hscale):
         ctx.set_font_size(self.font_size)
 
-        for i in range(r):
+        for i in range(lines):
             ctx.set_source_rgb(.5, .5, .5)
             lheight = gsize[1][1] - nscale * i * hscale
             ctx.move_to(6, lheight + 3)
@@ -183,13 +286,14 @@ class HeaterGraph(Gtk.DrawingArea):
             ctx.move_to(gsize[0][0], lheight)
             ctx.line_to(gsize[1][0], lheight)
             ctx.stroke()
-        return hscale
 
-    def graph_time(self, ctx: cairoContext, gsize, points_per_pixel):
+    def graph_time(self, ctx: cairoContext, gsize, points_per_pixel, interval=1):
 
         now = datetime.datetime.now()
-        first = gsize[1][0] - (now.second + ((now.minute % 2) * 60)) / points_per_pixel
-        steplen = 120 / points_per_pixel  # For 120s
+        step = 120 * interval  # 120 samples
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        first = gsize[1][0] - (seconds % step) / interval / points_per_pixel
+        steplen = step / interval / points_per_pixel
 
         font_size_multiplier = round(self.font_size * 1.5)
         ctx.set_font_size(self.font_size)
@@ -207,9 +311,9 @@ class HeaterGraph(Gtk.DrawingArea):
             ctx.set_source_rgb(.5, .5, .5)
             ctx.move_to(x - font_size_multiplier, gsize[1][1] + font_size_multiplier)
 
-            ctx.show_text(f"{now - datetime.timedelta(minutes=2) * i:%H:%M}")
+            ctx.show_text(f"{now - datetime.timedelta(seconds=step) * i:%H:%M}")
             ctx.stroke()
-            i += 1 + self.printer.get_tempstore_size() // 601
+            i += 1 + self.printer.get_tempstore_size(self.tier) // 601
 
     def is_showing(self, device):
         return False if device not in self.store else self.store[device]['show']
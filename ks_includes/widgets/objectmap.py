@@ -1,4 +1,5 @@
 import logging
+import math
 
 import gi
 
@@ -30,6 +31,13 @@ class ObjectMap(Gtk.DrawingArea):
         self.excluded_objects = self.printer.get_stat("exclude_object", "excluded_objects")
         self.min_x = self.min_y = 99999999
         self.max_x = self.max_y = 0
+        # Geometry of self.objects: bounding boxes, grid buckets for hit-testing and the paths in screen space
+        self.geometry_source = None
+        self.boxes = []
+        self.grid = {}
+        self.grid_size = (1, 1)
+        self.paths = []
+        self.paths_key = None
 
     def x_graph_to_bed(self, width, gx):
         return (((gx - self.margin_left) * (self.max_x - self.min_x))
@@ -41,24 +49,70 @@ class ObjectMap(Gtk.DrawingArea):
 
     def event_cb(self, da, ev):
         # Convert coordinates from screen-graph to bed
+        self.update_geometry()
+        if not self.boxes:
+            return
         x = self.x_graph_to_bed(da.get_allocated_width(), ev.x)
         y = self.y_graph_to_bed(da.get_allocated_height(), ev.y)
         logging.info(f"Touched GRAPH {ev.x:.0f},{ev.y:.0f} BED: {x:.0f},{y:.0f}")
 
-        for obj in self.objects:
-            obj_min_x = obj_max_x = obj["polygon"][0][0]
-            obj_min_y = obj_max_y = obj["polygon"][0][1]
-            for point in obj["polygon"]:
-                obj_min_x = min(obj_min_x, point[0])
-                obj_min_y = min(obj_min_y, point[1])
-                obj_max_x = max(obj_max_x, point[0])
-                obj_max_y = max(obj_max_y, point[1])
+        for i in self.grid.get(self.grid_cell(x, y), ()):
+            obj_min_x, obj_min_y, obj_max_x, obj_max_y = self.boxes[i]
             if obj_min_x < x < obj_max_x and obj_min_y < y < obj_max_y:
+                obj = self.objects[i]
                 logging.info(f"TOUCHED object it's: {obj['name']}")
-                if obj['name'] not in self.excluded_objects:
+                if obj['name'] not in self.printer.get_stat("exclude_object", "excluded_objects"):
                     self.exclude_object(obj['name'])
                 break
 
+    def update_geometry(self):
+        self.objects = self.printer.get_stat("exclude_object", "objects")
+        if self.objects is self.geometry_source:
+            return
+        self.geometry_source = self.objects
+        self.paths_key = None
+        self.boxes = []
+        for obj in self.objects:
+            xs = [point[0] for point in obj["polygon"]]
+            ys = [point[1] for point in obj["polygon"]]
+            self.boxes.append((min(xs), min(ys), max(xs), max(ys)) if xs else (0, 0, 0, 0))
+        if not self.boxes:
+            self.grid = {}
+            return
+        self.min_x = min(box[0] for box in self.boxes)
+        self.min_y = min(box[1] for box in self.boxes)
+        self.max_x = max(box[2] for box in self.boxes)
+        self.max_y = max(box[3] for box in self.boxes)
+        # About one object per bucket, every object is added to the buckets its bounding box overlaps
+        side = max(math.ceil(math.sqrt(len(self.boxes))), 1)
+        self.grid_size = (side, side)
+        self.grid = {}
+        for i, box in enumerate(self.boxes):
+            first_x, first_y = self.grid_cell(box[0], box[1])
+            last_x, last_y = self.grid_cell(box[2], box[3])
+            for cell_x in range(first_x, last_x + 1):
+                for cell_y in range(first_y, last_y + 1):
+                    self.grid.setdefault((cell_x, cell_y), []).append(i)
+
+    def grid_cell(self, x, y):
+        columns, rows = self.grid_size
+        cell_x = int((x - self.min_x) / (self.max_x - self.min_x) * columns) if self.max_x > self.min_x else 0
+        cell_y = int((y - self.min_y) / (self.max_y - self.min_y) * rows) if self.max_y > self.min_y else 0
+        return min(max(cell_x, 0), columns - 1), min(max(cell_y, 0), rows - 1)
+
+    def update_paths(self, width, height):
+        key = (width, height)
+        if self.paths_key == key:
+            return
+        self.paths_key = key
+        if self.max_x <= self.min_x or self.max_y <= self.min_y:
+            self.paths = []
+            return
+        self.paths = [
+            [(self.x_bed_to_graph(width, point[0]), self.y_bed_to_graph(height, point[1])) for point in obj["polygon"]]
+            for obj in self.objects
+        ]
+
     def exclude_object(self, name):
         script = {"script": f"EXCLUDE_OBJECT NAME={name}"}
         self._screen._confirm_send_action(
@@ -71,16 +125,8 @@ class ObjectMap(Gtk.DrawingArea):
     def draw_graph(self, da, ctx):
         right = da.get_allocated_width() - self.margin_right
         bottom = da.get_allocated_height() - self.margin_bottom
-        self.objects = self.printer.get_stat("exclude_object", "objects")
-
-        for obj in self.objects:
-            for point in obj["polygon"]:
-                # Find min coords
-                self.min_x = min(self.min_x, point[0])
-                self.min_y = min(self.min_y, point[1])
-                # Find max coords
-                self.max_x = max(self.max_x, point[0])
-                self.max_y = max(self.max_y, point[1])
+        self.update_geometry()
+        self.update_paths(da.get_allocated_width(), da.get_allocated_height())
 
         # Styling
         ctx.set_source_rgb(.5, .5, .5)  # Grey
@@ -120,23 +166,21 @@ class ObjectMap(Gtk.DrawingArea):
         ctx.set_dash([1, 0])
 
         # Draw objects
-        for obj in self.objects:
+        current_object = self.printer.get_stat("exclude_object", "current_object")
+        excluded_objects = self.printer.get_stat("exclude_object", "excluded_objects")
+        for obj, path in zip(self.objects, self.paths):
+            if not path:
+                continue
             # change the color depending on the status
-            if obj['name'] == self.printer.get_stat("exclude_object", "current_object"):
+            if obj['name'] == current_object:
                 ctx.set_source_rgb(1, 0, 0)  # Red
-            elif obj['name'] in self.printer.get_stat("exclude_object", "excluded_objects"):
+            elif obj['name'] in excluded_objects:
                 ctx.set_source_rgb(0, 0, 0)  # Black
             else:
                 ctx.set_source_rgb(.5, .5, .5)  # Grey
-            for i, point in enumerate(obj["polygon"]):
-                # Convert coordinates from bed to screen-graph
-                x = self.x_bed_to_graph(da.get_allocated_width(), point[0])
-                y = self.y_bed_to_graph(da.get_allocated_height(), point[1])
-                if i == 0:
-                    ctx.move_to(x, y)
-                    continue
-                ctx.line_to(x, y)
-                # logging.info(f"obj graph: {x=:.0f},{y=:.0f} bed: {point[0]:.0f},{point[1]:.0f}")
+            ctx.move_to(*path[0])
+            for point in path[1:]:
+                ctx.line_to(*point)
             ctx.close_path()
             ctx.fill()
             ctx.stroke()
@@ -64,6 +64,8 @@ class ScreenSaver:
 
         self.blackbox = box
         self.blackbox.show_all()
+        self.screen.redraw.pause()
+        self.screen.timers.suspend()
         self.screen.power_devices(None, self.config.get_main_config().get("screen_off_devices", ""), on=False)
         return False
 
@@ -75,6 +77,8 @@ class ScreenSaver:
         self.blackbox = None
         for child in self.screen.overlay.get_children():
             child.show()
+        self.screen.timers.resume()
+        self.screen.redraw.resume()
         if self.screen.use_dpms:
             self.screen.wake_screen()
         else:
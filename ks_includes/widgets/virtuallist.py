@@ -0,0 +1,148 @@
+import math
+
+import gi
+
+gi.require_version("Gtk", "3.0")
+from gi.repository import GLib, Gtk
+
+
+class VirtualList(Gtk.Layout):
+    """
+    A scrollable grid that only creates widgets for the visible rows plus an overscan,
+    the widgets are recycled as the user scrolls
+
+    Args:
+        create_func: returns a new empty widget
+        bind_func (widget, item): fills the widget with the item
+        unbind_func (widget): optional, called before the widget is reused for another item
+        columns (int: 1): items per row
+        overscan (int: 2): rows kept bound above and below the visible area
+
+    Rows have the same height, the tallest bound widget sets it.
+    """
+
+    def __init__(self, create_func, bind_func, unbind_func=None, columns=1, overscan=2):
+        super().__init__(hexpand=True, vexpand=True)
+        self.create_func = create_func
+        self.bind_func = bind_func
+        self.unbind_func = unbind_func
+        self.columns = max(columns, 1)
+        self.overscan = overscan
+        self.items = []
+        self.bound = {}
+        self.pool = []
+        self.width = 0
+        self.row_height = 0
+        self.adjustment = None
+        self.update_source = None
+        self.connect("size-allocate", self.on_size_allocate)
+        self.connect("notify::vadjustment", self.on_vadjustment)
+
+    def on_vadjustment(self, *args):
+        vadjustment = self.get_vadjustment()
+        if vadjustment is not None and vadjustment != self.adjustment:
+            self.adjustment = vadjustment
+            vadjustment.connect("value-changed", self.update)
+
+    def on_size_allocate(self, widget, allocation):
+        if allocation.width != self.width:
+            self.width = allocation.width
+            self.row_height = 0
+        # Children can't be resized while allocating
+        self.queue_update()
+
+    def queue_update(self):
+        if self.update_source is None:
+            self.update_source = GLib.idle_add(self.update)
+
+    def set_items(self, items):
+        self.items = items
+        self.refresh()
+
+    def set_item(self, index, item):
+        self.items[index] = item
+        if index in self.bound:
+            if self.unbind_func is not None:
+                self.unbind_func(self.bound[index])
+            self.bind(index, self.bound[index])
+
+    def get_bound(self):
+        return list(self.bound.values())
+
+    def refresh(self):
+        for index in list(self.bound):
+            self.release(index)
+        self.update()
+
+    def update(self, *args):
+        if self.update_source is not None:
+            GLib.source_remove(self.update_source)
+            self.update_source = None
+        if self.width <= 0:
+            return False
+        if not self.items:
+            for index in list(self.bound):
+                self.release(index)
+            self.set_size(self.width, 1)
+            return False
+        if self.row_height <= 0:
+            self.row_height = 1
+            self.acquire(0)
+        if self.adjustment is not None:
+            top = self.adjustment.get_value()
+            page = self.adjustment.get_page_size()
+        else:
+            top, page = 0, self.get_allocated_height()
+        rows = math.ceil(len(self.items) / self.columns)
+        first = max(int(top // self.row_height) - self.overscan, 0)
+        last = min(int((top + page) // self.row_height) + self.overscan + 1, rows)
+        visible = range(first * self.columns, min(last * self.columns, len(self.items)))
+        for index in list(self.bound):
+            if index not in visible:
+                self.release(index)
+        height = self.row_height
+        for index in visible:
+            if index not in self.bound:
+                self.acquire(index)
+        if self.row_height != height:
+            # A taller row showed up, lay out everything again with the new height
+            for index, widget in self.bound.items():
+                self.place(index, widget)
+            return self.update()
+        self.set_size(self.width, rows * self.row_height)
+        return False
+
+    def acquire(self, index):
+        if self.pool:
+            widget = self.pool.pop()
+        else:
+            widget = self.create_func()
+            # Hidden pooled widgets must not be shown by a show_all() on an ancestor
+            widget.set_no_show_all(True)
+            self.put(widget, 0, 0)
+        self.bound[index] = widget
+        self.bind(index, widget)
+
+    def bind(self, index, widget):
+        self.bind_func(widget, self.items[index])
+        widget.set_size_request(-1, -1)
+        for child in widget.get_children():
+            child.show_all()
+        widget.show()
+        width = self.width // self.columns
+        height = widget.get_preferred_height_for_width(width)[1]
+        if height > self.row_height:
+            self.row_height = height
+        self.place(index, widget)
+
+    def place(self, index, widget):
+        width = self.width // self.columns
+        widget.set_size_request(width, self.row_height)
+        self.move(widget, (index % self.columns) * width, (index // self.columns) * self.row_height)
+
+    def release(self, index):
+        widget = self.bound.pop(index)
+        if self.unbind_func is not None:
+            self.unbind_func(widget)
+        widget.hide()
+        self.pool.append(widget)
@@ -4,8 +4,7 @@ import logging
 import gi
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import GLib, Gtk, Pango
-from jinja2 import Environment
+from gi.repository import Gtk, Pango
 from datetime import datetime
 from math import log
 from ks_includes.screen_panel import ScreenPanel
@@ -160,6 +159,8 @@ class BasePanel(ScreenPanel):
     def show_heaters(self, show=True):
         for child in self.control['temp_box'].get_children():
             self.control['temp_box'].remove(child)
+        # The devices may have changed, or the printer
+        self.unsubscribe_all()
         if self._printer is None or not show:
             return
         try:
@@ -174,6 +175,8 @@ class BasePanel(ScreenPanel):
                 if icon is not None:
                     self.labels[f'{device}_box'].pack_start(icon, False, False, 3)
                 self.labels[f'{device}_box'].pack_start(self.labels[device], False, False, 0)
+                self.subscribe(f"{device}.temperature", self.update_heater_label)
+                self.update_heater_label(device, "temperature", self._printer.get_stat(device, "temperature"))
 
             # Limit the number of items according to resolution
             nlimit = int(round(log(self._screen.width, 10) * 5 - 10.5))
@@ -231,9 +234,9 @@ class BasePanel(ScreenPanel):
 
     def activate(self):
         if self.time_update is None:
-            self.time_update = GLib.timeout_add_seconds(1, self.update_time)
+            self.time_update = self._screen.timers.add_seconds(1, self.update_time, visible_only=True)
         if self.battery_update is None:
-            self.battery_update = GLib.timeout_add_seconds(60, self.battery_percentage)
+            self.battery_update = self._screen.timers.add_seconds(60, self.battery_percentage, visible_only=True)
 
     def add_content(self, panel):
         printing = self._printer and self._printer.state in {"printing", "paused"}
@@ -305,21 +308,6 @@ class BasePanel(ScreenPanel):
             return
         if action != "notify_status_update" or self._screen.printer is None:
             return
-        devices = self._printer.get_temp_devices()
-        if not devices:
-            return
-        for device in devices:
-            temp = self._printer.get_stat(device, "temperature")
-            if temp and device in self.labels:
-                name = ""
-                if not (device.startswith("extruder") or device.startswith("heater_bed")):
-                    if self.titlebar_name_type == "full":
-                        name = device.split()[1] if len(device.split()) > 1 else device
-                        name = f'{self.prettify(name)}: '
-                    elif self.titlebar_name_type == "short":
-                        name = device.split()[1] if len(device.split()) > 1 else device
-                        name = f"{name[:1].upper()}: "
-                self.labels[device].set_label(f"{name}{temp:.0f}°")
 
         if (self.current_extruder and 'toolhead' in data and 'extruder' in data['toolhead']
                 and data["toolhead"]["extruder"] != self.current_extruder):
@@ -331,6 +319,22 @@ class BasePanel(ScreenPanel):
 
         return False
 
+    def update_heater_label(self, device, field, temp):
+        if not temp or device not in self.labels:
+            return
+        name = ""
+        if not (device.startswith("extruder") or device.startswith("heater_bed")):
+            if self.titlebar_name_type == "full":
+                name = device.split()[1] if len(device.split()) > 1 else device
+                name = f'{self.prettify(name)}: '
+            elif self.titlebar_name_type == "short":
+                name = device.split()[1] if len(device.split()) > 1 else device
+                name = f"{name[:1].upper()}: "
+        label = f"{name}{temp:.0f}°"
+        # The value changes more often than the rounded text, avoid needless relayouts
+        if self.labels[device].get_label() != label:
+            self.labels[device].set_label(label)
+
     def remove(self, widget):
         self.content.remove(widget)
 
@@ -365,13 +369,11 @@ class BasePanel(ScreenPanel):
         if not title:
             self.titlelbl.set_label(f"{printer}")
             return
-        try:
-            env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
-            env.install_gettext_translations(self._config.get_lang())
-            j2_temp = env.from_string(title)
-            title = j2_temp.render()
-        except Exception as e:
-            logging.debug(f"Error parsing jinja for title: {title}\n{e}")
+        if "{" in title:
+            try:
+                title = self._screen.env.from_string(title).render()
+            except Exception as e:
+                logging.debug(f"Error parsing jinja for title: {title}\n{e}")
 
         self.titlelbl.set_label(f"{printer} {title}")
 
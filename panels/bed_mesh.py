@@ -98,7 +98,7 @@ class Panel(ScreenPanel):
             self.labels['map'].set_rotation(rotation)
             logging.info(f"Inversion X: {invert_x} Y: {invert_y} Rotation: {rotation}")
         self.labels['map'].update_bm(self.retrieve_bm(profile), self.mesh_radius)
-        self.labels['map'].queue_draw()
+        self._screen.redraw.queue(self.labels['map'], "bed_mesh")
 
     def add_profile(self, profile):
         logging.debug(f"Adding Profile: {profile}")
@@ -97,7 +97,7 @@ class Panel(ScreenPanel):
 
     def update_graph(self, widget=None, profile=None):
         self.labels['map'].update_bm(self.retrieve_bm(profile))
-        self.labels['map'].queue_draw()
+        self._screen.redraw.queue(self.labels['map'], "bed_mesh")
 
     def add_profile(self, profile):
         logging.debug(f"Adding Profile: {profile}")
@@ -1,5 +1,4 @@
 import logging
-import mpv
 
 import gi
 
@@ -64,6 +63,8 @@ class Panel(ScreenPanel):
             vf_list.append(f"rotate:{cam['rotation'] * 3.14159 / 180}")
         logging.info(f"video filters: {vf_list}")
 
+        import mpv  # Only loaded when a camera is played, it's slow to import
+
         if self.mpv:
             self.mpv.terminate()
         self.mpv = mpv.MPV(fullscreen=True, log_handler=self.log, vo='gpu,wlshm,xv,x11')
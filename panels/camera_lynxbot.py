@@ -1,4 +1,3 @@
-import mpv
 import logging
 import gi
 
@@ -36,6 +35,8 @@ class Panel(ScreenPanel):
             self.mpv = None
 
     def play(self, fs=None):
+        import mpv  # Only loaded when a camera is played, it's slow to import
+
         if self.mpv:
             self.mpv.terminate()
             self.mpv = None
@@ -118,4 +118,4 @@ class Panel(ScreenPanel):
 
     def update_graph(self):
         if self.labels['map']:
-            self.labels['map'].queue_draw()
+            self._screen.redraw.queue(self.labels['map'], "object_map")
@@ -9,6 +9,7 @@ from datetime import datetime
 from ks_includes.screen_panel import ScreenPanel
 from ks_includes.KlippyGtk import find_widget
 from ks_includes.widgets.flowboxchild_extended import PrintListItem
+from ks_includes.widgets.virtuallist import VirtualList
 
 
 def format_label(widget):
@@ -40,6 +41,8 @@ class Panel(ScreenPanel):
         self.showing_rename = False
         self.loading = False
         self.cur_directory = 'gcodes'
+        self.entries = []
+        self.placeholders = {}
         self.list_button_size = self._gtk.img_scale * self.bts
 
         self.headerbox = Gtk.Box(hexpand=True, vexpand=False)
@@ -72,21 +75,13 @@ class Panel(ScreenPanel):
         self.thumbsize = self._gtk.img_scale * self._gtk.button_image_scale * 2.5
         logging.info(f"Thumbsize: {self.thumbsize:.1f}")
 
-        self.flowbox = Gtk.FlowBox(selection_mode=Gtk.SelectionMode.NONE,
-                                   column_spacing=0, row_spacing=0)
         list_mode = self._config.get_main_config().get("print_view", 'thumbs')
         logging.info(list_mode)
         self.list_mode = list_mode == 'list'
-        if self.list_mode:
-            self.flowbox.set_min_children_per_line(1)
-            self.flowbox.set_max_children_per_line(1)
-        else:
-            columns = 3 if self._screen.vertical_mode else 4
-            self.flowbox.set_min_children_per_line(columns)
-            self.flowbox.set_max_children_per_line(columns)
 
-        self.scroll = self._gtk.ScrolledWindow()
-        self.scroll.add(self.flowbox)
+        self.scroll = self._gtk.ScrolledWindow(hscrollbar_policy=Gtk.PolicyType.NEVER)
+        self.files_list = None
+        self.create_list()
 
         self.main = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, vexpand=True)
         self.main.add(self.headerbox)
@@ -96,121 +91,154 @@ class Panel(ScreenPanel):
         self.set_loading(True)
         self._screen._ws.klippy.get_dir_info(self.load_files, self.cur_directory)
 
+    def create_list(self):
+        # Only the visible rows have widgets, they are recycled while scrolling
+        if self.files_list is not None:
+            self.cancel_thumbnails()
+            self.scroll.remove(self.files_list)
+        columns = 1 if self.list_mode else 3 if self._screen.vertical_mode else 4
+        self.files_list = VirtualList(self.create_row, self.bind_row, self.unbind_row, columns)
+        self.files_list.set_items(self.entries)
+        self.scroll.add(self.files_list)
+
     def switch_view_mode(self, widget):
         self.list_mode ^= True
         logging.info(f"lista {self.list_mode}")
-        if self.list_mode:
-            self.flowbox.set_min_children_per_line(1)
-            self.flowbox.set_max_children_per_line(1)
-        else:
-            columns = 3 if self._screen.vertical_mode else 4
-            self.flowbox.set_min_children_per_line(columns)
-            self.flowbox.set_max_children_per_line(columns)
+        self.create_list()
+        self.scroll.show_all()
         self._config.set("main", "print_view", 'list' if self.list_mode else 'thumbs')
         self._config.save_user_config_options()
-        self._refresh_files()
 
     def activate(self):
         if self.cur_directory != "gcodes":
             self.change_dir()
+        else:
+            # Rebind the rows, thumbnails that were cancelled on deactivate get loaded again
+            self.files_list.refresh()
         self._screen.files.add_callback(self._callback)
 
     def deactivate(self):
         self._screen.files.remove_callback(self._callback)
+        self.cancel_thumbnails()
 
-    def create_item(self, item):
-        fbchild = PrintListItem()
-        fbchild.set_date(item['modified'])
-        fbchild.set_size(item['size'])
+    def create_entry(self, item):
         if 'dirname' in item:
             if item['dirname'].startswith("."):
-                return
+                return None
             name = item['dirname']
             path = f"{self.cur_directory}/{name}"
-            fbchild.set_as_dir(True)
         elif 'filename' in item:
             if (item['filename'].startswith(".") or
                     os.path.splitext(item['filename'])[1] not in {'.gcode', '.gco', '.g'}):
-                return
+                return None
             name = item['filename']
             path = f"{self.cur_directory}/{name}"
             path = path.replace('gcodes/', '')
         else:
             logging.error(f"Unknown item {item}")
-            return
-        basename = os.path.splitext(name)[0]
-        fbchild.set_path(path)
-        fbchild.set_name(basename.casefold())
+            return None
+        return {'path': path, 'name': os.path.splitext(name)[0], 'is_dir': 'dirname' in item, 'item': item}
+
+    def create_row(self):
+        row = PrintListItem()
         if self.list_mode:
-            label = Gtk.Label(label=basename, hexpand=True, vexpand=False)
-            format_label(label)
+            narrow = self._screen.width < 400
             info = Gtk.Label(
                 hexpand=True, halign=Gtk.Align.START, xalign=0,
                 wrap=True, wrap_mode=Pango.WrapMode.WORD_CHAR,
             )
             info.get_style_context().add_class("print-info")
-            info.set_markup(self.get_info_str(item, path))
             delete = Gtk.Button(hexpand=False, vexpand=False, can_focus=False, always_show_image=True)
             delete.get_style_context().add_class("color1")
             delete.set_image(self._gtk.Image("delete", self.list_button_size, self.list_button_size))
+            delete.connect("clicked", self.delete_entry, row)
             rename = Gtk.Button(hexpand=False, vexpand=False, can_focus=False, always_show_image=True)
             rename.get_style_context().add_class("color2")
             rename.set_image(self._gtk.Image("files", self.list_button_size, self.list_button_size))
+            rename.connect("clicked", self.rename_entry, row)
             itemname = Gtk.Label(hexpand=True, halign=Gtk.Align.START, ellipsize=Pango.EllipsizeMode.END)
             itemname.get_style_context().add_class("print-filename")
-            itemname.set_markup(f"<big><b>{basename}</b></big>")
-            icon = Gtk.Button()
-            row = Gtk.Grid(hexpand=True, vexpand=False, valign=Gtk.Align.CENTER)
-            row.get_style_context().add_class("frame-item")
-            if self._screen.width >= 400:
-                row.attach(icon, 0, 0, 1, 2)
-            row.attach(itemname, 1, 0, 3, 1)
-            row.attach(info, 1, 1, 1, 1)
-            row.attach(rename, 2, 1, 1, 1)
-            row.attach(delete, 3, 1, 1, 1)
-            if 'filename' in item:
-                icon.connect("clicked", self.confirm_print, path)
-                image_args = (path, icon, self.thumbsize / 2, True, "file")
-                delete.connect("clicked", self.confirm_delete_file, f"gcodes/{path}")
-                rename.connect("clicked", self.show_rename, f"gcodes/{path}")
-                action_icon = "printer" if self._printer.extrudercount > 0 else "load"
-                action = self._gtk.Button(action_icon, style="color3")
-                action.connect("clicked", self.confirm_print, path)
+            icon = Gtk.Button(no_show_all=narrow)
+            icon.connect("clicked", self.open_entry, row)
+            action_icon = "printer" if self._printer.extrudercount > 0 else "load"
+            start = self._gtk.Button(action_icon, style="color3")
+            opendir = self._gtk.Button("load", style="color3")
+            for action in (start, opendir):
+                action.connect("clicked", self.open_entry, row)
                 action.set_hexpand(False)
                 action.set_vexpand(False)
                 action.set_halign(Gtk.Align.END)
-                if self._screen.width >= 400:
-                    row.attach(action, 4, 0, 1, 2)
-                else:
-                    icon.get_style_context().add_class("color3")
-                    row.attach(icon, 4, 0, 1, 2)
-            elif 'dirname' in item:
-                icon.connect("clicked", self.change_dir, path)
-                image_args = (None, icon, self.thumbsize / 2, True, "folder")
-                delete.connect("clicked", self.confirm_delete_directory, path)
-                rename.connect("clicked", self.show_rename, path)
-                action = self._gtk.Button("load", style="color3")
-                action.connect("clicked", self.change_dir, path)
-                action.set_hexpand(False)
-                action.set_vexpand(False)
-                action.set_halign(Gtk.Align.END)
-                row.attach(action, 4, 0, 1, 2)
+                action.set_no_show_all(True)
+            grid = Gtk.Grid(hexpand=True, vexpand=False, valign=Gtk.Align.CENTER)
+            grid.get_style_context().add_class("frame-item")
+            if narrow:
+                icon.get_style_context().add_class("color3")
+                grid.attach(icon, 4, 0, 1, 2)
             else:
-                return
-            fbchild.add(row)
+                grid.attach(icon, 0, 0, 1, 2)
+                grid.attach(start, 4, 0, 1, 2)
+            grid.attach(opendir, 4, 0, 1, 2)
+            grid.attach(itemname, 1, 0, 3, 1)
+            grid.attach(info, 1, 1, 1, 1)
+            grid.attach(rename, 2, 1, 1, 1)
+            grid.attach(delete, 3, 1, 1, 1)
+            row.widgets = {'name': itemname, 'info': info, 'icon': icon, 'start': start, 'opendir': opendir}
+            row.add(grid)
         else:  # Thumbnail view
-            icon = self._gtk.Button(label=basename)
-            if 'filename' in item:
-                icon.connect("clicked", self.confirm_print, path)
-                image_args = (path, icon, self.thumbsize, False, "file")
-            elif 'dirname' in item:
-                icon.connect("clicked", self.change_dir, path)
-                image_args = (None, icon, self.thumbsize, False, "folder")
+            icon = self._gtk.Button(label="")
+            icon.connect("clicked", self.open_entry, row)
+            row.widgets = {'icon': icon}
+            row.add(icon)
+        return row
+
+    def bind_row(self, row, entry):
+        # A late thumbnail of the previous entry must not replace the one of this entry
+        self.unbind_row(row)
+        row.entry = entry
+        icon = row.widgets['icon']
+        if not entry['is_dir']:
+            self._screen.files.prioritize_metadata(entry['path'])
+        if self.list_mode:
+            row.widgets['name'].set_markup(f"<big><b>{entry['name']}</b></big>")
+            row.widgets['info'].set_markup(self.get_info_str(entry['item'], entry['path']))
+            row.widgets['opendir'].set_visible(entry['is_dir'])
+            if self._screen.width < 400:
+                icon.set_visible(not entry['is_dir'])
             else:
-                return
-            fbchild.add(icon)
-        self.image_load(*image_args)
-        return fbchild
+                row.widgets['start'].set_visible(not entry['is_dir'])
+            size, small = self.thumbsize / 2, True
+        else:
+            icon.set_label(entry['name'])
+            size, small = self.thumbsize, False
+        if entry['is_dir']:
+            row.thumbnail = self.image_load(None, icon, size, small, "folder")
+        else:
+            row.thumbnail = self.image_load(entry['path'], icon, size, small, "file")
+
+    @staticmethod
+    def unbind_row(row):
+        if row.thumbnail is not None:
+            row.thumbnail.cancel()
+            row.thumbnail = None
+        row.entry = None
+
+    def open_entry(self, widget, row):
+        if row.entry['is_dir']:
+            self.change_dir(widget, row.entry['path'])
+        else:
+            self.confirm_print(widget, row.entry['path'])
+
+    def delete_entry(self, widget, row):
+        if row.entry['is_dir']:
+            self.confirm_delete_directory(widget, row.entry['path'])
+        else:
+            self.confirm_delete_file(widget, f"gcodes/{row.entry['path']}")
+
+    def rename_entry(self, widget, row):
+        if row.entry['is_dir']:
+            self.show_rename(widget, row.entry['path'])
+        else:
+            self.show_rename(widget, f"gcodes/{row.entry['path']}")
 
     def show_path(self):
         self.labels['path'].set_vexpand(False)
@@ -221,12 +249,28 @@ class Panel(ScreenPanel):
             self.labels['path'].show()
 
     def image_load(self, filepath, widget, size=-1, small=True, iconname=None):
-        pixbuf = self.get_file_image(filepath, size, size, small)
-        if pixbuf is not None:
-            widget.set_image(Gtk.Image.new_from_pixbuf(pixbuf))
-        elif iconname is not None:
-            widget.set_image(self._gtk.Image(iconname, size, size))
+        # The icon is a placeholder until the thumbnail is loaded in the background
+        if iconname is not None:
+            if (iconname, size) not in self.placeholders:
+                self.placeholders[(iconname, size)] = self._gtk.PixbufFromIcon(iconname, size, size)
+            pixbuf = self.placeholders[(iconname, size)]
+            widget.set_image(Gtk.Image.new_from_pixbuf(pixbuf) if pixbuf is not None else Gtk.Image())
         format_label(widget)
+        if filepath is not None:
+            return self.get_file_image_async(filepath, size, size, small, self.image_loaded, widget)
+        return None
+
+    @staticmethod
+    def image_loaded(pixbuf, widget):
+        image = Gtk.Image.new_from_pixbuf(pixbuf)
+        widget.set_image(image)
+        image.show()
+
+    def cancel_thumbnails(self):
+        for row in self.files_list.get_bound():
+            if row.thumbnail is not None:
+                row.thumbnail.cancel()
+                row.thumbnail = None
 
     def confirm_delete_file(self, widget, filepath):
         logging.debug(f"Sending delete_file {filepath}")
@@ -263,6 +307,7 @@ class Panel(ScreenPanel):
         if directory != self.cur_directory:
             logging.info(f'Changing directory to: {directory}')
             self.cur_directory = directory
+            self._screen.files.cancel_metadata_requests()
         self.show_path()
         self._refresh_files()
 
@@ -287,33 +332,14 @@ class Panel(ScreenPanel):
     def set_sort(self):
         reverse = self.sort_current[1] != 0
         if self.sort_current[0] == "name":
-            self.flowbox.set_sort_func(self.sort_names, reverse)
+            self.entries.sort(key=lambda entry: entry['name'].casefold(), reverse=reverse)
         elif self.sort_current[0] == "date":
-            self.flowbox.set_sort_func(self.sort_dates, reverse)
+            self.entries.sort(key=lambda entry: entry['item'].get('modified', 0), reverse=reverse)
         elif self.sort_current[0] == "size":
-            self.flowbox.set_sort_func(self.sort_sizes, reverse)
-
-    @staticmethod
-    def sort_names(a: PrintListItem, b: PrintListItem, reverse):
-        if a.get_is_dir() - b.get_is_dir() != 0:
-            return a.get_is_dir() - b.get_is_dir()
-        if a.get_name() < b.get_name():
-            return 1 if reverse else -1
-        if a.get_name() > b.get_name():
-            return -1 if reverse else 1
-        return 0
-
-    @staticmethod
-    def sort_sizes(a: PrintListItem, b: PrintListItem, reverse):
-        if a.get_is_dir() - b.get_is_dir() != 0:
-            return a.get_is_dir() - b.get_is_dir()
-        return b.get_size() - a.get_size() if reverse else a.get_size() - b.get_size()
-
-    @staticmethod
-    def sort_dates(a: PrintListItem, b: PrintListItem, reverse):
-        if a.get_is_dir() - b.get_is_dir() != 0:
-            return a.get_is_dir() - b.get_is_dir()
-        return b.get_date() - a.get_date() if reverse else a.get_date() - b.get_date()
+            self.entries.sort(key=lambda entry: entry['item'].get('size', 0), reverse=reverse)
+        # Directories always go first, the sort is stable
+        self.entries.sort(key=lambda entry: not entry['is_dir'])
+        self.files_list.set_items(self.entries)
 
     def confirm_print(self, widget, filename):
         action = _("Print") if self._printer.extrudercount > 0 else _("Start")
@@ -441,39 +467,50 @@ class Panel(ScreenPanel):
         if not result.get("result") or not isinstance(result["result"], dict):
             logging.info(result)
             return
-        items = [self.create_item(item) for item in [*result["result"]["dirs"], *result["result"]["files"]]]
-        for item in filter(None, items):
-            self.flowbox.add(item)
+        entries = [self.create_entry(item) for item in [*result["result"]["dirs"], *result["result"]["files"]]]
+        self.entries = [entry for entry in entries if entry is not None]
         self.set_sort()
         self.set_loading(False)
         logging.info(f"Loaded in {(datetime.now() - start).total_seconds():.3f} seconds")
+        logging.debug(f"Thumbnail cache: {self._gtk.thumbnails.get_stats()}")
 
     def delete_from_list(self, path):
         logging.info(f"deleting {path}")
-        for item in self.flowbox.get_children():
-            if item.get_path() in {path, f"gcodes/{path}"}:
+        for index, entry in enumerate(self.entries):
+            if entry['path'] in {path, f"gcodes/{path}"}:
                 logging.info("found removing")
-                self.flowbox.remove(item)
+                del self.entries[index]
+                self.files_list.set_items(self.entries)
                 return True
 
     def add_item_from_callback(self, action, data):
         item = data['item']
         if 'source_item' in data:
             self.delete_from_list(data['source_item']['path'])
-        else:
-            self.delete_from_list(item['path'])
+        source = item['path']
         path = os.path.join("gcodes", item["path"])
-        if self.cur_directory != os.path.dirname(path):
+        entry = None
+        if self.cur_directory == os.path.dirname(path):
+            if action in {"create_dir", "move_dir"}:
+                item.update({"path": path, "dirname": os.path.split(item["path"])[1]})
+            else:
+                item.update({"path": path, "filename": os.path.split(item["path"])[1]})
+            entry = self.create_entry(item)
+        if entry is None:
+            self.delete_from_list(source)
             return
-        if action in {"create_dir", "move_dir"}:
-            item.update({"path": path, "dirname": os.path.split(item["path"])[1]})
-        else:
-            item.update({"path": path, "filename": os.path.split(item["path"])[1]})
-        fbchild = self.create_item(item)
-        if fbchild:
-            self.flowbox.add(fbchild)
-            self.flowbox.invalidate_sort()
-            self.flowbox.show_all()
+        for index, old in enumerate(self.entries):
+            if old['path'] != entry['path']:
+                continue
+            if old['is_dir'] == entry['is_dir'] and (old['item'].get('modified'), old['item'].get('size')) \
+                    == (item.get('modified'), item.get('size')):
+                # Usually new metadata, the position doesn't change so only that row is updated
+                self.files_list.set_item(index, entry)
+                return
+            del self.entries[index]
+            break
+        self.entries.append(entry)
+        self.set_sort()
 
     def _callback(self, action, data):
         logging.info(f"{action}: {data}")
@@ -491,8 +528,9 @@ class Panel(ScreenPanel):
     def _refresh_files(self, *args):
         logging.info("Refreshing")
         self.set_loading(True)
-        for child in self.flowbox.get_children():
-            self.flowbox.remove(child)
+        self.entries = []
+        self.files_list.set_items(self.entries)
+        self.scroll.get_vadjustment().set_value(0)
         self._screen._ws.klippy.get_dir_info(self.load_files, self.cur_directory)
 
     def set_loading(self, loading):
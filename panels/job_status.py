@@ -29,6 +29,7 @@ class Panel(ScreenPanel):
         self.fila_section = pi * ((1.75 / 2) ** 2)
         self.filename_label = {'complete': "Filename"}
         self.filename = ""
+        self.thumbnail_request = None
         self.prev_pos = None
         self.prev_gpos = None
         self.can_close = False
@@ -339,16 +340,16 @@ class Panel(ScreenPanel):
 
     def activate(self):
         if self.flow_timeout is None:
-            self.flow_timeout = GLib.timeout_add_seconds(2, self.update_flow)
+            self.flow_timeout = self._screen.timers.add_seconds(2, self.update_flow, visible_only=True)
         if self.animation_timeout is None:
-            self.animation_timeout = GLib.timeout_add(500, self.animate_label)
+            self.animation_timeout = self._screen.timers.add(500, self.animate_label, visible_only=True)
 
     def deactivate(self):
         if self.flow_timeout is not None:
-            GLib.source_remove(self.flow_timeout)
+            self._screen.timers.remove(self.flow_timeout)
             self.flow_timeout = None
         if self.animation_timeout is not None:
-            GLib.source_remove(self.animation_timeout)
+            self._screen.timers.remove(self.animation_timeout)
             self.animation_timeout = None
 
     def create_buttons(self):
@@ -572,12 +573,13 @@ class Panel(ScreenPanel):
                 self.buttons['speed'].set_label(self.labels['req_speed'].get_label())
             if 'live_extruder_velocity' in data['motion_report']:
                 self.flowstore.append(self.fila_section * float(data["motion_report"]["live_extruder_velocity"]))
-        fan_label = ""
-        for fan in self.fans:
-            self.fans[fan]['speed'] = f"{self._printer.get_fan_speed(fan) * 100:3.0f}%"
-            fan_label += f" {self.fans[fan]['name']}{self.fans[fan]['speed']}"
-        if fan_label:
-            self.buttons['fan'].set_label(fan_label[:12])
+        if any(fan in data for fan in self.fans):
+            fan_label = ""
+            for fan in self.fans:
+                self.fans[fan]['speed'] = f"{self._printer.get_fan_speed(fan) * 100:3.0f}%"
+                fan_label += f" {self.fans[fan]['name']}{self.fans[fan]['speed']}"
+            if fan_label:
+                self.buttons['fan'].set_label(fan_label[:12])
         if "print_stats" in data:
             if 'state' in data['print_stats']:
                 self.set_state(
@@ -709,7 +711,7 @@ class Panel(ScreenPanel):
     def update_progress(self, progress: float):
         self.progress = progress
         self.labels['progress_text'].set_label(f"{trunc(progress * 100)}%")
-        self.labels['darea'].queue_draw()
+        self._screen.redraw.queue(self.labels['darea'], "progress")
 
     def set_state(self, state, msg=""):
         if state == "printing":
@@ -801,10 +803,14 @@ class Panel(ScreenPanel):
         if width <= 1 or height <= 1:
             width = max_width
             height = max_height
-        pixbuf = self.get_file_image(self.filename, width, height)
-        if pixbuf is None:
+        if self.thumbnail_request is not None:
+            self.thumbnail_request.cancel()
+        self.thumbnail_request = self.get_file_image_async(self.filename, width, height, False, self.set_thumbnail)
+        if self.thumbnail_request is None:
             logging.debug("no pixbuf")
-            return
+
+    def set_thumbnail(self, pixbuf):
+        self.thumbnail_request = None
         if image := find_widget(self.labels['thumbnail'], Gtk.Image):
             image.set_from_pixbuf(pixbuf)
 
@@ -847,7 +853,7 @@ class Panel(ScreenPanel):
             self._update_file_metadata()
         elif not response:
             logging.debug("Cannot find file metadata. Listening for updated metadata")
-            self._files.request_metadata(self.filename)
+            self._files.request_metadata(self.filename, priority=True)
         else:
             logging.debug("Cannot load file metadata")
         self.show_file_thumbnail()
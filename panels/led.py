@@ -35,7 +35,7 @@ class Panel(ScreenPanel):
         title = title or _("Leds")
         super().__init__(screen, title)
         self.da_size = self._gtk.img_scale * 2
-        self.preview = ColorPreviewArea(size=self.da_size)
+        self.preview = ColorPreviewArea(self._screen.redraw, size=self.da_size)
         self.preview.set_size_request(-1, self.da_size * 2)
         self.preview_label = Gtk.Label()
         self.preset_list = Gtk.Grid(row_homogeneous=True, column_homogeneous=True)
@@ -111,7 +111,7 @@ class Panel(ScreenPanel):
             color = [0, 0, 0, 0]
             color[idx] = 1
             button = self._gtk.Button()
-            preview = ColorPreviewArea(size=self.da_size)
+            preview = ColorPreviewArea(self._screen.redraw, size=self.da_size)
             preview.set_color(color)
             button.set_image(preview)
             button.connect("clicked", self.apply_preset, color)
@@ -130,21 +130,9 @@ class Panel(ScreenPanel):
             scale_grid.attach(scale, 1, idx, 3, 1)
         grid.attach(scale_grid, 0, 0, 3, 1)
 
-        columns = 3 if self._screen.vertical_mode else 2
-        data_misc = self._screen.apiclient.send_request(
-            "server/database/item?namespace=mainsail&key=miscellaneous.entries")
-        if data_misc:
-            presets_data = data_misc['value'][next(iter(data_misc["value"]))]['presets']
-            if presets_data:
-                self.presets.update(self.parse_presets(presets_data))
-        for i, key in enumerate(self.presets):
-            logging.info(f'Adding preset: {key}')
-            preview = ColorPreviewArea(size=self.da_size)
-            preview.set_color(self.presets[key])
-            button = self._gtk.Button()
-            button.set_image(preview)
-            button.connect("clicked", self.apply_preset, self.presets[key])
-            self.preset_list.attach(button, i % columns, int(i / columns) + 1, 1, 1)
+        self.show_presets()
+        self.track_request(self._screen.apiclient.send_request_async(
+            "server/database/item?namespace=mainsail&key=miscellaneous.entries", self.load_presets))
 
         scroll = self._gtk.ScrolledWindow()
         scroll.add(self.preset_list)
@@ -160,6 +148,28 @@ class Panel(ScreenPanel):
             grid.attach(box, 3, 0, 2, 1)
         return grid
 
+    def load_presets(self, data_misc):
+        if not data_misc:
+            return
+        presets_data = data_misc['value'][next(iter(data_misc["value"]))]['presets']
+        if presets_data:
+            self.presets.update(self.parse_presets(presets_data))
+            self.show_presets()
+
+    def show_presets(self):
+        for child in self.preset_list.get_children():
+            self.preset_list.remove(child)
+        columns = 3 if self._screen.vertical_mode else 2
+        for i, key in enumerate(self.presets):
+            logging.info(f'Adding preset: {key}')
+            preview = ColorPreviewArea(self._screen.redraw, size=self.da_size)
+            preview.set_color(self.presets[key])
+            button = self._gtk.Button()
+            button.set_image(preview)
+            button.connect("clicked", self.apply_preset, self.presets[key])
+            self.preset_list.attach(button, i % columns, int(i / columns) + 1, 1, 1)
+        self.preset_list.show_all()
+
     def update_preview_label(self, args):
         self.preview_label.set_label(rgb_to_hex(rgbw_to_rgb(self.color_data)))
 
@@ -210,14 +220,15 @@ class Panel(ScreenPanel):
 class ColorPreviewArea(Gtk.DrawingArea):
     color = [0, 0, 0]
 
-    def __init__(self, size=-1):
+    def __init__(self, redraw, size=-1):
         super().__init__(width_request=size, height_request=size)
+        self.redraw = redraw
         self.connect("draw", self.on_draw)
 
     def set_color(self, value):
         logging.debug(f"color: {value}")
         self.color = rgbw_to_rgb(value)
-        self.queue_draw()
+        self.redraw.queue(self, "color_preview")
 
     def on_draw(self, da, ctx):
         ctx.set_source_rgb(*self.color)
@@ -5,7 +5,7 @@ import gi
 import screen
 
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, GLib
+from gi.repository import Gtk
 from panels.menu import Panel as MenuPanel
 from ks_includes.widgets.heatergraph import HeaterGraph
 from ks_includes.widgets.keypad import Keypad
@@ -59,15 +59,15 @@ class Panel(MenuPanel):
         if count > 0 and not force_hide:
             if self.labels['da'] not in self.left_panel:
                 self.left_panel.add(self.labels['da'])
-            self.labels['da'].queue_draw()
+            self._screen.redraw.queue(self.labels['da'], "graph")
             self.labels['da'].show()
             if self.graph_update is None:
                 # This has a high impact on load
-                self.graph_update = GLib.timeout_add_seconds(5, self.update_graph)
+                self.graph_update = self._screen.timers.add_seconds(5, self.update_graph, visible_only=True)
         elif self.labels['da'] in self.left_panel:
             self.left_panel.remove(self.labels['da'])
             if self.graph_update is not None:
-                GLib.source_remove(self.graph_update)
+                self._screen.timers.remove(self.graph_update)
                 self.graph_update = None
         return False
 
@@ -78,7 +78,7 @@ class Panel(MenuPanel):
 
     def deactivate(self):
         if self.graph_update is not None:
-            GLib.source_remove(self.graph_update)
+            self._screen.timers.remove(self.graph_update)
             self.graph_update = None
         if self.active_heater is not None:
             self.hide_numpad()
@@ -340,7 +340,7 @@ class Panel(MenuPanel):
         self._screen.base_panel.set_control_sensitive(True, control='back')
 
     def update_graph(self):
-        self.labels['da'].queue_draw()
+        self._screen.redraw.queue(self.labels['da'], "graph")
         return True
 
     def back(self):
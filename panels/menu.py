@@ -5,7 +5,6 @@ import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk
-from jinja2 import Template
 from ks_includes.screen_panel import ScreenPanel
 from ks_includes.widgets.autogrid import AutoGrid
 
@@ -96,6 +95,7 @@ class Panel(ScreenPanel):
             return self.ks_printer_cfg and self.ks_printer_cfg.get("camera_url", None) is not None
         # self.j2_data = self._printer.get_printer_status_data()
         try:
+            from jinja2 import Template
             j2_temp = Template(enable, autoescape=True)
             return j2_temp.render(self.j2_data) == 'True'
         except Exception as e:
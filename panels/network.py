@@ -6,7 +6,6 @@ import gi
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, GLib, Pango
 from ks_includes.screen_panel import ScreenPanel
-from ks_includes.sdbus_nm import SdbusNm
 from datetime import datetime
 
 
@@ -18,6 +17,8 @@ class Panel(ScreenPanel):
         self.last_drop_time = datetime.now()
         self.show_add = False
         try:
+            # sdbus is imported here, a missing dependency shows the error below
+            from ks_includes.sdbus_nm import SdbusNm
             self.sdbus_nm = SdbusNm(self.popup_callback)
         except Exception as e:
             logging.exception("Failed to initialize")
@@ -425,16 +426,18 @@ class Panel(ScreenPanel):
                     self.sdbus_nm.rescan()
                     self.load_networks()
                 self.update_all_networks()
-                self.update_timeout = GLib.timeout_add_seconds(5, self.update_all_networks)
+                self.update_timeout = self._screen.timers.add_seconds(5, self.update_all_networks, visible_only=True)
             else:
                 self.update_single_network_info()
-                self.update_timeout = GLib.timeout_add_seconds(5, self.update_single_network_info)
+                self.update_timeout = self._screen.timers.add_seconds(
+                    5, self.update_single_network_info, visible_only=True
+                )
 
     def deactivate(self):
         if self.sdbus_nm is None:
             return
         if self.update_timeout is not None:
-            GLib.source_remove(self.update_timeout)
+            self._screen.timers.remove(self.update_timeout)
             self.update_timeout = None
         if self.sdbus_nm.wifi:
             self.sdbus_nm.enable_monitoring(False)
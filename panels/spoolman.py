@@ -387,12 +387,14 @@ class Panel(ScreenPanel):
 
     def load_spools(self, data=None):
         hide_archived = self._config.get_config().getboolean("spoolman", "hide_archived", fallback=True)
-        self._model.clear()
-        self._materials.clear()
-        spools = self.apiClient.post_request("server/spoolman/proxy", json={
+        self.track_request(self.apiClient.post_request_async("server/spoolman/proxy", self.spools_loaded, json={
             "request_method": "GET",
             "path": f"/v1/spool?allow_archived={not hide_archived}",
-        })
+        }))
+
+    def spools_loaded(self, spools):
+        self._model.clear()
+        self._materials.clear()
         if not spools or "result" not in spools:
             self._screen.show_popup_message(_("Error trying to fetch spools"))
             return
@@ -425,10 +427,12 @@ class Panel(ScreenPanel):
             self._screen.show_popup_message(_("Error setting active spool"))
             return
 
-    def get_active_spool(self) -> SpoolmanSpool:
-        result = self.apiClient.send_request("server/spoolman/spool_id")
+    def get_active_spool(self):
+        self.track_request(self.apiClient.send_request_async("server/spoolman/spool_id", self.active_spool_loaded))
+
+    def active_spool_loaded(self, result):
         if not result:
             self._screen.show_popup_message(_("Error getting active spool"))
             return
         self._active_spool_id = result["spool_id"]
-        return self._active_spool_id
+        self._treeview.queue_draw()
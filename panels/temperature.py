@@ -194,15 +194,15 @@ class Panel(ScreenPanel):
         if count > 0 and not force_hide:
             if self.labels["da"] not in self.left_panel:
                 self.left_panel.add(self.labels["da"])
-            self.labels["da"].queue_draw()
+            self._screen.redraw.queue(self.labels["da"], "graph")
             self.labels["da"].show()
             if self.graph_update is None:
                 # This has a high impact on load
-                self.graph_update = GLib.timeout_add_seconds(5, self.update_graph)
+                self.graph_update = self._screen.timers.add_seconds(5, self.update_graph, visible_only=True)
         elif self.labels["da"] in self.left_panel:
             self.left_panel.remove(self.labels["da"])
             if self.graph_update is not None:
-                GLib.source_remove(self.graph_update)
+                self._screen.timers.remove(self.graph_update)
                 self.graph_update = None
 
     def activate(self):
@@ -237,7 +237,7 @@ class Panel(ScreenPanel):
 
     def deactivate(self):
         if self.graph_update is not None:
-            GLib.source_remove(self.graph_update)
+            self._screen.timers.remove(self.graph_update)
             self.graph_update = None
         if self.active_heater is not None:
             self.hide_numpad()
@@ -674,5 +674,5 @@ class Panel(ScreenPanel):
         self.popover.popdown()
 
     def update_graph(self):
-        self.labels["da"].queue_draw()
+        self._screen.redraw.queue(self.labels["da"], "graph")
         return True
@@ -10,14 +10,18 @@ import subprocess
 import pathlib
 import traceback  # noqa
 import locale
-import re
 import sys
+from ks_includes import profiler
+
+if any(arg.startswith("--profile-startup") for arg in sys.argv):
+    # Enabled before the imports below, so they are measured too
+    profiler.enable()
+
 import gi
 
 gi.require_version("Gtk", "3.0")
 from gi.repository import Gtk, Gdk, GLib, Pango
 from importlib import import_module
-from jinja2 import Environment
 from signal import SIGTERM
 from datetime import datetime
 
@@ -26,7 +30,11 @@ from ks_includes.KlippyWebsocket import KlippyWebsocket
 from ks_includes.KlippyRest import KlippyRest
 from ks_includes.files import KlippyFiles
 from ks_includes.KlippyGtk import KlippyGtk
+from ks_includes.preloader import PanelPreloader
 from ks_includes.printer import Printer
+from ks_includes.redraw import RedrawScheduler
+from ks_includes.startup import StartupInitializer
+from ks_includes.timers import TimerRegistry
 from ks_includes.widgets.keyboard import Keyboard
 from ks_includes.widgets.prompts import Prompt
 from ks_includes.widgets.lockscreen import LockScreen
@@ -77,6 +85,9 @@ class KlipperScreen(Gtk.Window):
     notification_log = []
     prompt = None
     tempstore_timeout = None
+    tempstore_pending = False
+    _env = None
+    startup = None
     check_dpms_timeout = None
 
     def __init__(self, args):
@@ -94,14 +105,15 @@ class KlipperScreen(Gtk.Window):
         self.confirm = None
         self.style_options = {}
         self.panels_reinit = []
+        self.panels_cache_size = 0
+        self.panels_cache_memory = 0
         self.last_popup_time = datetime.now()
 
         configfile = os.path.normpath(os.path.expanduser(args.configfile))
 
-        self._config = KlipperScreenConfig(configfile, self)
-        self.lang_ltr = set_text_direction(self._config.get_main_config().get("language", None))
-        self.env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
-        self.env.install_gettext_translations(self._config.get_lang())
+        with profiler.phase("config"):
+            self._config = KlipperScreenConfig(configfile, self)
+            self.lang_ltr = set_text_direction(self._config.get_main_config().get("language", None))
 
         self.connect("key-press-event", self._key_press_event)
         self.connect("configure_event", self.update_size)
@@ -147,17 +159,23 @@ class KlipperScreen(Gtk.Window):
         self.show_cursor = self._config.get_main_config().getboolean("show_cursor", fallback=False)
         self.setup_gtk_settings()
         self.style_provider = Gtk.CssProvider()
+        self.redraw = RedrawScheduler(self._config.get_main_config())
+        self.timers = TimerRegistry()
         self.screensaver = ScreenSaver(self)
         self.gtk = KlippyGtk(self)
         self.base_css = ""
-        self.load_base_styles()
+        with profiler.phase("css"):
+            self.load_base_styles()
         self.set_icon_from_file(os.path.join(klipperscreendir, "styles", "icon.svg"))
-        self.base_panel = BasePanel(self)
-        self.change_theme(self.theme)
+        with profiler.phase("base panel"):
+            self.base_panel = BasePanel(self)
+        with profiler.phase("theme and icons"):
+            self.change_theme(self.theme)
         self.overlay = Gtk.Overlay()
         self.add(self.overlay)
         self.overlay.add_overlay(self.base_panel.main_grid)
-        self.show_all()
+        with profiler.phase("show"):
+            self.show_all()
         self.update_cursor(self.show_cursor)
         min_ver = (3, 8)
         if sys.version_info < min_ver:
@@ -178,9 +196,22 @@ class KlipperScreen(Gtk.Window):
         self.extrude_panel = None
         self.lighting_output_pins = None
         self.lock_screen = LockScreen(self)
+        self.preloader = PanelPreloader(self, self._config.get_main_config().getint("panel_preload", 3))
+        self.panels_cache_size = self._config.get_main_config().getint("panel_cache_size", 12)
+        self.panels_cache_memory = self._config.get_main_config().getint("panel_cache_memory", 0) * 1024 * 1024
 
         self.log_notification("KlipperScreen Started", 1)
-        self.initial_connection()
+        with profiler.phase("initial connection"):
+            self.initial_connection()
+
+    @property
+    def env(self):
+        # jinja2 is slow to import, it's only needed to render templates in some confirmations
+        if self._env is None:
+            from jinja2 import Environment
+            self._env = Environment(extensions=["jinja2.ext.i18n"], autoescape=True)
+            self._env.install_gettext_translations(self._config.get_lang())
+        return self._env
 
     def update_cursor(self, show: bool):
         self.show_cursor = show
@@ -215,7 +246,9 @@ class KlipperScreen(Gtk.Window):
             "shutdown": self.state_shutdown
         }
         for printer in self.printers:
-            printer["data"] = Printer(self.state_execute, state_callbacks)
+            printer["data"] = Printer(
+                self.state_execute, state_callbacks, self._config.get_main_config().getfloat("temp_history_hours", 24)
+            )
         default_printer = self._config.get_main_config().get('default_printer')
         logging.debug(f"Default printer: {default_printer}")
         if [True for p in self.printers if default_printer in p]:
@@ -252,13 +285,19 @@ class KlipperScreen(Gtk.Window):
             0,
         )
         self.printer = self.printers[ind]["data"]
+        if self.apiclient is not None:
+            self.apiclient.close()
         self.apiclient = KlippyRest(
             self.printers[ind][name]["moonraker_host"],
             self.printers[ind][name]["moonraker_port"],
             self.printers[ind][name]["moonraker_api_key"],
             self.printers[ind][name]["moonraker_path"],
             self.printers[ind][name]["moonraker_ssl"],
+            self._config.get_main_config().getfloat("http_timeout", 4),
+            self._config.get_main_config().getint("http_retries", 2),
         )
+        # The callbacks of the old client are dropped
+        self.tempstore_pending = False
         self._ws = KlippyWebsocket(
             {
                 "on_connect": self.websocket_connected,
@@ -271,11 +310,13 @@ class KlipperScreen(Gtk.Window):
             self.printers[ind][name]["moonraker_api_key"],
             self.printers[ind][name]["moonraker_path"],
             self.printers[ind][name]["moonraker_ssl"],
+            self._config.get_main_config().getint("status_update_interval", 100),
         )
         if self.files is None:
             self.files = KlippyFiles(self)
         else:
             self.files.reinit()
+        self._ws.add_preprocessor("server.files.metadata", self.files.preprocess_metadata)
 
         self.reinit_count = 0
         self.printer_initializing(_("Connecting to %s") % name, True)
@@ -368,13 +409,42 @@ class KlipperScreen(Gtk.Window):
                 logging.info(f"Reinitializing panel {panel}")
                 self.panels[panel_name].__init__(self, title, **kwargs)
                 self.panels_reinit.remove(panel_name)
+            # Keep self.panels ordered from the least to the most recently used
+            self.panels[panel_name] = self.panels.pop(panel_name)
             self._cur_panels.append(panel_name)
+            self.preloader.record(panel_name)
             if 'extra' in kwargs and hasattr(self.panels[panel], "set_extra"):
                 self.panels[panel].set_extra(**kwargs)
             self.attach_panel(panel_name)
+            self.evict_panels()
         except Exception as e:
             logging.exception(f"Error attaching panel:\n{e}\n\n{traceback.format_exc()}")
 
+    def evict_panels(self):
+        # The panels in view and the splash screen are never evicted
+        pinned = {*self._cur_panels, "splash_screen"}
+        candidates = [name for name in self.panels if name not in pinned]
+        if self.panels_cache_size > 0:
+            while len(self.panels) > self.panels_cache_size and candidates:
+                self.destroy_panel(candidates.pop(0))
+        if self.panels_cache_memory > 0 and candidates:
+            sizes = {name: self.panels[name].estimate_size() for name in candidates}
+            total = sum(sizes.values())
+            while total > self.panels_cache_memory and candidates:
+                name = candidates.pop(0)
+                total -= sizes[name]
+                self.destroy_panel(name)
+
+    def destroy_panel(self, name):
+        logging.debug(f"Evicting panel {name}")
+        panel = self.panels.pop(name)
+        if name in self.panels_reinit:
+            self.panels_reinit.remove(name)
+        try:
+            panel.destroy()
+        except Exception as e:
+            logging.exception(f"Error destroying panel {name}: {e}")
+
     def set_panel_title(self, title):
         self.base_panel.set_title(title)
 
@@ -391,7 +461,9 @@ class KlipperScreen(Gtk.Window):
             self.process_update("notify_status_update", self.printer.data)
         if hasattr(self.panels[panel], "activate"):
             self.panels[panel].activate()
+        self.panels[panel].active = True
         self.show_all()
+        self.preloader.schedule()
 
     def log_notification(self, message, level=0):
         time = datetime.now().strftime("%H:%M:%S")
@@ -491,8 +563,14 @@ class KlipperScreen(Gtk.Window):
     def error_modal_response(dialog, response_id):
         os._exit(1)
 
+    def save_state(self):
+        # The caches written in the background must be on disk before exiting
+        if self.files is not None:
+            self.files.cache.close()
+
     def restart_ks(self, *args):
         logging.debug(f"Restarting {sys.executable} {' '.join(sys.argv)}")
+        self.save_state()
         os.execv(sys.executable, ['python'] + sys.argv)
         # noinspection PyUnreachableCode
         self._ws.send_method("machine.services.restart", {"service": "KlipperScreen"})  # Fallback
@@ -616,6 +694,7 @@ class KlipperScreen(Gtk.Window):
             return
         if hasattr(self.panels[self._cur_panels[-1]], "deactivate"):
             self.panels[self._cur_panels[-1]].deactivate()
+        self.panels[self._cur_panels[-1]].active = False
         self.base_panel.remove(self.panels[self._cur_panels[-1]].content)
 
     def _menu_go_back(self, widget=None, home=False):
@@ -735,6 +814,9 @@ class KlipperScreen(Gtk.Window):
     def websocket_disconnected(self):
         logging.debug("### websocket_disconnected")
         self.printer.state = "disconnected"
+        # The values would be stale, the history gets the gap when the store is received again
+        self.printer.stop_tempstore_updates()
+        self.files.connection_lost()
         self.connecting = True
         self.connected_printer = None
         self.initialized = False
@@ -800,7 +882,7 @@ class KlipperScreen(Gtk.Window):
     def change_language(self, widget, lang):
         self._config.install_language(lang)
         self.lang_ltr = set_text_direction(lang)
-        self.env.install_gettext_translations(self._config.get_lang())
+        self._env = None
         self._config._create_configurable_options(self)
         self._config.set('main', 'language', lang)
         self._config.save_user_config_options()
@@ -836,7 +918,9 @@ class KlipperScreen(Gtk.Window):
             self.printer.process_update({'webhooks': {'state': "ready"}})
             return
         elif action == "notify_status_update" and self.printer.state != "shutdown":
-            self.printer.process_update(data)
+            data = self.printer.process_update(data, diffed=True)
+            if not data:
+                return
             if 'manual_probe' in data and data['manual_probe']['is_active'] and 'zcalibrate' not in self._cur_panels:
                 self.show_panel(self.z_calibrate_panell, _('Z Calibrate'))
             if "screws_tilt_adjust" in data and 'bed_level' not in self._cur_panels:
@@ -859,8 +943,6 @@ class KlipperScreen(Gtk.Window):
             self.printer.process_power_update(data)
             self.panels['splash_screen'].check_power_status()
         elif action == "notify_gcode_response" and self.printer.state not in ["error", "shutdown"]:
-            if re.match('^(?:ok\\s+)?(B|C|T\\d*):', data):
-                return
             if data.startswith("// action:"):
                 self.process_action(data[10:])
                 return
@@ -1055,7 +1137,11 @@ class KlipperScreen(Gtk.Window):
                                       + f'{self.apiclient.status}')
             self.initializing = False
             return False
-        self.server_info = self.apiclient.get_server_info()
+        self.apiclient.get_server_info_async(self.moonraker_server_info)
+        return False
+
+    def moonraker_server_info(self, server_info):
+        self.server_info = server_info
         if not self.server_info:
             logging.info("Cannot get server info")
             if self.reinit_count > 0:
@@ -1065,9 +1151,12 @@ class KlipperScreen(Gtk.Window):
                 self._init_printer(_("Connecting to %s") % self.connecting_to_printer)
             self.initializing = False
             self.reinit_count += 1
-            return False
+            return
+        if self._ws.closing:
+            logging.info("Cancelling attempt")
+            self.initializing = False
+            return
         self._ws.initial_connect()
-        return False
 
     def init_moonraker_components(self):
         popup = ''
@@ -1089,16 +1178,20 @@ class KlipperScreen(Gtk.Window):
         if popup:
             self.show_popup_message(popup, level)
         if "power" in self.server_info["components"]:
-            powerdevs = self.apiclient.send_request("machine/device_power/devices")
-            if powerdevs is not False:
-                self.printer.configure_power_devices(powerdevs)
+            self._ws.send_method("machine.device_power.devices", {}, self.init_power_devices)
         if "webcam" in self.server_info["components"]:
-            cameras = self.apiclient.send_request("server/webcams/list")
-            if cameras is not False:
-                self.printer.configure_cameras(cameras['webcams'])
+            self._ws.send_method("server.webcams.list", {}, self.init_cameras)
         if "spoolman" in self.server_info["components"]:
             self.printer.enable_spoolman()
 
+    def init_power_devices(self, response, method, params):
+        if "result" in response:
+            self.printer.configure_power_devices(response["result"])
+
+    def init_cameras(self, response, method, params):
+        if "result" in response:
+            self.printer.configure_cameras(response["result"]["webcams"])
+
     def init_klipper(self):
         if self.reinit_count > self.max_retries or 'printer_select' in self._cur_panels:
             logging.info("Stopping Retries")
@@ -1108,9 +1201,35 @@ class KlipperScreen(Gtk.Window):
             self.connect_to_moonraker()
             return False
         self.reinit_count += 1
-        self.server_info = self.apiclient.get_server_info()
+        # Everything that doesn't depend on the printer configuration is requested at once,
+        # the steps run as soon as their responses arrive
+        if self.startup is not None:
+            self.startup.cancel()
+        self.startup = StartupInitializer(self._ws)
+        self.startup.request("server_info", "server.info")
+        self.startup.request("printer_info", "printer.info")
+        self.startup.request("config", "printer.objects.query", {"objects": {"configfile": None}})
+        self.startup.request("gcode_help", "printer.gcode.help")
+        self.startup.request("system_info", "machine.system_info")
+        self.startup.request("server_config", "server.config")
+        self.startup.request("temperature_store", "server.temperature_store")
+        self.startup.step("klippy", ("server_info",), self.startup_klippy)
+        self.startup.step("printer", ("klippy", "printer_info", "config", "gcode_help", "system_info"),
+                          self.startup_printer)
+        self.startup.step("status", ("printer", "status"), self.startup_status)
+        self.startup.step("tempstore", ("printer", "server_config", "temperature_store"), self.startup_tempstore)
+        return False
+
+    def startup_klippy(self, server_info):
+        if server_info:
+            self.server_info = server_info
         logging.info(f"Moonraker info {self.server_info}")
+        if not server_info:
+            self.startup.cancel()
+            self._init_printer(_("Cannot connect to Moonraker") + "\n\n" + f'{self.apiclient.status}')
+            return False
         if self.server_info['klippy_connected'] is False:
+            self.startup.cancel()
             msg = _("Moonraker: connected") + "\n\n"
             msg += f"Klipper: {self.server_info['klippy_state']}" + "\n\n"
             if self.reinit_count <= self.max_retries:
@@ -1118,17 +1237,19 @@ class KlipperScreen(Gtk.Window):
             self.printer_initializing(msg)
             GLib.timeout_add_seconds(3, self.init_klipper)
             return False
-        printer_info = self.apiclient.get_printer_info()
+        return True
+
+    def startup_printer(self, klippy, printer_info, config, gcode_help, info):
         if printer_info is False:
+            self.startup.cancel()
             self._init_printer("Unable to get printer info from moonraker")
             return False
-        config = self.apiclient.send_request("printer/objects/query?configfile")
         if config is False:
+            self.startup.cancel()
             self._init_printer("Error getting printer configuration")
             return False
         self.printer.reinit(printer_info, config['status'])
-        self.printer.available_commands = self.apiclient.get_gcode_help()
-        info = self.apiclient.send_request("machine/system_info")
+        self.printer.available_commands = gcode_help or {}
         if info and 'system_info' in info:
             self.printer.system_info = info['system_info']
 
@@ -1165,9 +1286,12 @@ class KlipperScreen(Gtk.Window):
             *self.printer.get_output_pins(),
             *self.printer.get_leds(),
         )
+        self.startup.request("status", "printer.objects.query", {"objects": {item: None for item in items}})
+        return True
 
-        data = self.apiclient.send_request("printer/objects/query?" + "&".join(items))
+    def startup_status(self, printer, data):
         if data is False:
+            self.startup.cancel()
             self._init_printer("Error getting printer object data")
             return False
         self.ws_subscribe()
@@ -1211,12 +1335,39 @@ class KlipperScreen(Gtk.Window):
                 self.printer.enable_home_full()
 
         self.log_notification("Printer Initialized", 1)
-        return False
+        logging.info(f"Printer usable after {self.startup.elapsed():.0f} ms")
+        return True
+
+    def startup_tempstore(self, printer, server_config, tempstore):
+        if len(self.printer.get_temp_devices()) == 0:
+            return False
+        if tempstore is False:
+            # Moonraker may still be collecting data, retry through the usual path
+            self.init_tempstore()
+            return False
+        self.init_tempstore_data([server_config, tempstore])
+        return True
 
     def init_tempstore(self):
         if len(self.printer.get_temp_devices()) == 0:
             return False
-        tempstore = self.apiclient.send_request("server/temperature_store")
+        if self.tempstore_pending:
+            return False
+        self.tempstore_pending = True
+        self.apiclient.send_requests_async(
+            ["server/config", "server/temperature_store"], self.init_tempstore_data
+        )
+        return False
+
+    def init_tempstore_data(self, results):
+        self.tempstore_pending = False
+        server_config, tempstore = results
+        if server_config:
+            try:
+                self.printer.tempstore_size = server_config["config"]["data_store"]["temperature_store_size"]
+                logging.info(f"Temperature store size: {self.printer.tempstore_size}")
+            except KeyError:
+                logging.error("Couldn't get the temperature store size")
         if tempstore:
             self.printer.init_temp_store(tempstore)
             if hasattr(self.panels[self._cur_panels[-1]], "update_graph_visibility"):
@@ -1226,23 +1377,13 @@ class KlipperScreen(Gtk.Window):
         else:
             logging.error(f'Tempstore not ready: {tempstore} Retrying in 5 seconds')
             if self.tempstore_timeout:
-                return False
+                return
             if self.reinit_count < self.max_retries:
                 self.reinit_count += 1
                 self.tempstore_timeout = GLib.timeout_add_seconds(5, self.retry_init_tempstore)
             else:
                 logging.error("Max retries reached. Stopping attempts to initialize tempstore.")
                 self.remove_tempstore_timeout()
-            return False
-
-        server_config = self.apiclient.send_request("server/config")
-        if server_config:
-            try:
-                self.printer.tempstore_size = server_config["config"]["data_store"]["temperature_store_size"]
-                logging.info(f"Temperature store size: {self.printer.tempstore_size}")
-            except KeyError:
-                logging.error("Couldn't get the temperature store size")
-        return False
 
     def remove_tempstore_timeout(self):
         GLib.source_remove(self.tempstore_timeout)
@@ -1346,6 +1487,14 @@ class KlipperScreen(Gtk.Window):
             logging.info(f"Vertical mode: {self.vertical_mode}")
 
 
+def profile_first_draw(widget, context, path):
+    profiler.mark("first draw")
+    # Written once the frame is done
+    GLib.idle_add(profiler.write_report, path)
+    widget.disconnect_by_func(profile_first_draw)
+    return False
+
+
 def main():
     parser = argparse.ArgumentParser(description="KlipperScreen - A GUI for Klipper")
     homedir = os.path.expanduser("~")
@@ -1366,21 +1515,34 @@ def main():
         "-m", "--monitor", default="0", metavar='<monitor>',
         help="Number of the monitor, that will show Klipperscreen (default: 0)"
     )
+    parser.add_argument(
+        "--profile-startup", nargs="?", const=os.path.join(logdir, "KlipperScreen-startup.json"),
+        default=None, metavar='<report>',
+        help="Write a JSON report with the time spent on imports and each startup phase"
+    )
     args = parser.parse_args()
+    profiler.mark("arguments parsed")
 
     functions.setup_logging(os.path.normpath(os.path.expanduser(args.logfile)))
     functions.patch_threading_excepthook()
-    if not Gtk.init_check():
-        logging.critical("Failed to initialize Gtk")
-        raise RuntimeError
+    with profiler.phase("gtk init"):
+        if not Gtk.init_check():
+            logging.critical("Failed to initialize Gtk")
+            raise RuntimeError
     try:
-        win = KlipperScreen(args)
+        with profiler.phase("window"):
+            win = KlipperScreen(args)
     except Exception as e:
         logging.exception(f"Failed to initialize window\n{e}\n\n{traceback.format_exc()}")
         raise RuntimeError from e
     win.connect("destroy", Gtk.main_quit)
+    # systemd stops the service with SIGTERM, quit the main loop so the state is saved
+    GLib.unix_signal_add(GLib.PRIORITY_HIGH, SIGTERM, Gtk.main_quit)
+    if profiler.enabled:
+        win.connect("draw", profile_first_draw, args.profile_startup)
     win.show_all()
     Gtk.main()
+    win.save_state()
 
 
 if __name__ == "__main__":
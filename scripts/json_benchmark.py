@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# Compares the JSON libraries KlipperScreen can use on Moonraker traffic.
+#
+# Usage: python3 scripts/json_benchmark.py [recording] [-n iterations]
+#
+# The recording is a text file with one raw websocket message per line, it can be captured
+# by logging the messages received in KlippyWebsocket.on_message.
+# Without a recording a synthetic sample is generated, sized like a large printer
+# (status update bursts, a server.files.list with 2000 files and a big configfile).
+
+import argparse
+import json
+import random
+import statistics
+import time
+from importlib import import_module
+
+
+def synthetic_traffic():
+    rnd = random.Random(0)
+    messages = []
+    for i in range(500):
+        status = {
+            "motion_report": {
+                "live_position": [rnd.uniform(0, 300) for _ in range(4)],
+                "live_velocity": rnd.uniform(0, 300),
+                "live_extruder_velocity": rnd.uniform(-5, 5),
+            },
+            "extruder": {"temperature": rnd.uniform(200, 215), "power": rnd.random()},
+            "heater_bed": {"temperature": rnd.uniform(59, 61), "power": rnd.random()},
+            "toolhead": {"estimated_print_time": 1000.0 + i, "print_time": 999.0 + i},
+            "virtual_sdcard": {"file_position": 1000 * i, "progress": i / 500},
+        }
+        for s in range(15):
+            status[f"temperature_sensor sensor_{s}"] = {"temperature": rnd.uniform(20, 60)}
+        messages.append({"jsonrpc": "2.0", "method": "notify_status_update", "params": [status, 1000.0 + i]})
+    files = [
+        {
+            "path": f"folder_{f % 20}/print_{f:04d}_{'x' * rnd.randint(5, 40)}.gcode",
+            "modified": 1700000000.0 + f, "size": rnd.randint(10 ** 5, 10 ** 8), "permissions": "rw",
+        }
+        for f in range(2000)
+    ]
+    messages.append({"jsonrpc": "2.0", "result": files, "id": 1})
+    config = {
+        f"section_{c}": {f"option_{o}": f"{rnd.random():.6f}" for o in range(25)}
+        for c in range(300)
+    }
+    messages.append({"jsonrpc": "2.0", "result": {"status": {"configfile": {"config": config}}}, "id": 2})
+    return [json.dumps(message) for message in messages]
+
+
+def load_recording(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def codecs():
+    available = {"json": (json.loads, json.dumps)}
+    try:
+        orjson = import_module("orjson")
+        available["orjson"] = (orjson.loads, lambda obj: orjson.dumps(obj).decode())
+    except ImportError:
+        print("orjson is not installed")
+    try:
+        ujson = import_module("ujson")
+        available["ujson"] = (ujson.loads, ujson.dumps)
+    except ImportError:
+        print("ujson is not installed")
+    return available
+
+
+def timeit(func, items, iterations):
+    runs = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON libraries on Moonraker traffic")
+    parser.add_argument("recording", nargs="?", help="File with one websocket message per line")
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    messages = load_recording(args.recording) if args.recording else synthetic_traffic()
+    objects = [json.loads(message) for message in messages]
+    size = sum(len(message) for message in messages) / 1024
+    print(f"{len(messages)} messages, {size:.0f} KiB, median of {args.iterations} runs\n")
+
+    results = {}
+    for name, (loads, dumps) in codecs().items():
+        results[name] = (timeit(loads, messages, args.iterations), timeit(dumps, objects, args.iterations))
+
+    base_loads, base_dumps = results["json"]
+    print(f"{'library':<10}{'decode ms':>12}{'speedup':>10}{'encode ms':>12}{'speedup':>10}")
+    for name, (loads_ms, dumps_ms) in results.items():
+        print(f"{name:<10}{loads_ms:>12.2f}{base_loads / loads_ms:>9.1f}x"
+              f"{dumps_ms:>12.2f}{base_dumps / dumps_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()